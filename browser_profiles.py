@@ -0,0 +1,268 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from fake_useragent import UserAgent
+
+
+@dataclass
+class BrowserProfile:
+    """Постоянный профиль Chrome со стабильным отпечатком"""
+    name: str
+    path: str
+    user_agent: str
+    window_size: Tuple[int, int]
+    created_at: float
+
+    @property
+    def cache_dir(self) -> str:
+        return os.path.join(self.path, 'cache')
+
+
+class ProfilePool:
+    """Пул постоянных профилей Chrome (user-data-dir).
+
+    Профиль сохраняет cookies datanewton и Яндекса и дисковый HTTP-кэш
+    между запусками, поэтому повторные загрузки быстрее, а капча
+    появляется реже. Каждый профиль выдается только одному драйверу:
+    внутри процесса — под блокировкой, между процессами — через файл
+    аренды с PID владельца. Профили старше max_age_days и самые давно
+    использованные при превышении max_total_size_mb удаляются.
+    """
+    LEASE_FILE = '.lease'
+    META_FILE = 'profile.json'
+    BROKEN_DIR = '.broken'
+    WINDOW_SIZES = [(1920, 1080), (1536, 864), (1440, 900), (1366, 768), (1280, 800)]
+    GC_INTERVAL = 3600
+
+    _default: Optional['ProfilePool'] = None
+
+    def __init__(self, root: str = "browser_profiles", max_profiles: int = 8,
+                 max_total_size_mb: int = 4096, max_age_days: int = 30, cache_size_mb: int = 256):
+        self.root = root
+        self.max_profiles = max_profiles
+        self.max_total_size_mb = max_total_size_mb
+        self.max_age_days = max_age_days
+        self.cache_size_mb = cache_size_mb
+        self._lock = threading.Lock()
+        self._last_gc = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+    @classmethod
+    def default(cls) -> Optional['ProfilePool']:
+        """Общий на процесс пул; BROWSER_PROFILES_MAX=0 отключает постоянные профили"""
+        if cls._default is None:
+            max_profiles = int(os.getenv('BROWSER_PROFILES_MAX', '8'))
+            if max_profiles <= 0:
+                return None
+            cls._default = cls(
+                root=os.getenv('BROWSER_PROFILES_DIR', 'browser_profiles'),
+                max_profiles=max_profiles,
+                max_total_size_mb=int(os.getenv('BROWSER_PROFILES_MAX_SIZE_MB', '4096')),
+                max_age_days=int(os.getenv('BROWSER_PROFILES_MAX_AGE_DAYS', '30'))
+            )
+        return cls._default
+
+    def chrome_arguments(self, profile: BrowserProfile) -> List[str]:
+        width, height = profile.window_size
+        return [
+            f"--user-data-dir={os.path.abspath(profile.path)}",
+            f"--disk-cache-dir={os.path.abspath(profile.cache_dir)}",
+            f"--disk-cache-size={self.cache_size_mb * 1024 * 1024}",
+            f"--window-size={width},{height}",
+            f"user-agent={profile.user_agent}",
+        ]
+
+    def _profile_dirs(self) -> List[str]:
+        return [
+            os.path.join(self.root, name) for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, self.META_FILE))
+        ]
+
+    def _read_profile(self, path: str) -> Optional[BrowserProfile]:
+        try:
+            with open(os.path.join(path, self.META_FILE), encoding='utf-8') as f:
+                meta = json.load(f)
+            return BrowserProfile(
+                name=os.path.basename(path),
+                path=path,
+                user_agent=meta['user_agent'],
+                window_size=tuple(meta['window_size']),
+                created_at=meta['created_at']
+            )
+        except Exception as e:
+            print(f"Поврежденный профиль браузера {path}: {str(e)}")
+            return None
+
+    def _create_profile(self) -> BrowserProfile:
+        name = uuid.uuid4().hex[:12]
+        path = os.path.join(self.root, name)
+        os.makedirs(path)
+        profile = BrowserProfile(
+            name=name,
+            path=path,
+            user_agent=UserAgent().chrome,
+            window_size=random.choice(self.WINDOW_SIZES),
+            created_at=time.time()
+        )
+        with open(os.path.join(path, self.META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({
+                'user_agent': profile.user_agent,
+                'window_size': list(profile.window_size),
+                'created_at': profile.created_at
+            }, f)
+        return profile
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _is_leased(self, path: str) -> bool:
+        lease = os.path.join(path, self.LEASE_FILE)
+        try:
+            with open(lease) as f:
+                pid = int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError):
+            return True
+
+        if pid and self._pid_alive(pid):
+            return True
+
+        # Аренда осталась от завершившегося процесса
+        try:
+            os.remove(lease)
+        except OSError:
+            pass
+        return False
+
+    def _try_lease(self, path: str) -> bool:
+        if self._is_leased(path):
+            return False
+        try:
+            fd = os.open(os.path.join(path, self.LEASE_FILE), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def lease(self) -> Optional[BrowserProfile]:
+        """Выдача свободного профиля; None, если все профили заняты и лимит исчерпан"""
+        with self._lock:
+            if time.time() - self._last_gc > self.GC_INTERVAL:
+                self._gc()
+
+            # Сначала недавно использованные профили: у них самый теплый кэш
+            paths = sorted(self._profile_dirs(), key=self._last_used, reverse=True)
+            for path in paths:
+                if self._try_lease(path):
+                    profile = self._read_profile(path)
+                    if profile:
+                        return profile
+                    self._release_path(path)
+
+            if len(paths) >= self.max_profiles:
+                return None
+
+            profile = self._create_profile()
+            self._try_lease(profile.path)
+            return profile
+
+    def _release_path(self, path: str):
+        try:
+            os.utime(os.path.join(path, self.META_FILE))
+            os.remove(os.path.join(path, self.LEASE_FILE))
+        except OSError:
+            pass
+
+    def release(self, profile: BrowserProfile):
+        with self._lock:
+            self._release_path(profile.path)
+
+    def discard(self, profile: BrowserProfile):
+        """Профиль, с которым Chrome не запустился, убирается из пула.
+
+        Каталог переносится в .broken, а не удаляется сразу: его может держать
+        осиротевший процесс Chrome. Отложенные каталоги удаляет сборка мусора.
+        """
+        with self._lock:
+            broken = os.path.join(self.root, self.BROKEN_DIR)
+            os.makedirs(broken, exist_ok=True)
+            try:
+                os.replace(profile.path, os.path.join(broken, f"{profile.name}-{int(time.time())}"))
+            except OSError as e:
+                # Аренда остается за этим процессом, и профиль не выдается до его завершения
+                print(f"Не удалось отложить профиль браузера {profile.path}: {str(e)}")
+
+    def _last_used(self, path: str) -> float:
+        try:
+            return os.path.getmtime(os.path.join(path, self.META_FILE))
+        except OSError:
+            return 0.0
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        total = 0
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+                except OSError:
+                    continue
+        return total
+
+    def _remove(self, path: str) -> bool:
+        # Аренда перед удалением, чтобы профиль не достался другому процессу
+        if not self._try_lease(path):
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        return True
+
+    def _gc(self):
+        """Удаление свободных профилей по возрасту и общему размеру"""
+        self._last_gc = time.time()
+        max_age = self.max_age_days * 24 * 3600
+
+        broken = os.path.join(self.root, self.BROKEN_DIR)
+        if os.path.isdir(broken):
+            for name in os.listdir(broken):
+                shutil.rmtree(os.path.join(broken, name), ignore_errors=True)
+        free = []
+        total_size = 0
+
+        for path in self._profile_dirs():
+            size = self._dir_size(path)
+            total_size += size
+            if self._is_leased(path):
+                continue
+            profile = self._read_profile(path)
+            if profile is None or time.time() - profile.created_at > max_age:
+                if self._remove(path):
+                    total_size -= size
+                continue
+            free.append((self._last_used(path), size, path))
+
+        # Самые давно использованные удаляются первыми
+        for _, size, path in sorted(free):
+            if total_size <= self.max_total_size_mb * 1024 * 1024:
+                break
+            if self._remove(path):
+                total_size -= size
+
+    def gc(self):
+        with self._lock:
+            self._gc()
@@ -0,0 +1,290 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class FinancialYear:
+    """Показатели компании за один отчетный год (None — год не указан)"""
+    year: Optional[int]
+    revenue: Optional[float] = None
+    net_profit: Optional[float] = None
+
+
+@dataclass
+class CompanyFinancials:
+    """Финансовые показатели компании, годы от последнего к первому"""
+    inn: str
+    years: List[FinancialYear] = field(default_factory=list)
+    employees: Optional[int] = None
+    source: str = "network"
+    # Исходный текст со страницы, если показатели не удалось разобрать в числа
+    text: Optional[str] = None
+
+    @property
+    def latest(self) -> Optional[FinancialYear]:
+        return next((y for y in self.years if y.revenue is not None), None)
+
+    @staticmethod
+    def format_amount(value: float) -> str:
+        """Сумма в рублях в виде «1,2 млрд ₽»"""
+        for threshold, unit in ((1e12, "трлн"), (1e9, "млрд"), (1e6, "млн"), (1e3, "тыс.")):
+            if abs(value) >= threshold:
+                return f"{value / threshold:.1f} {unit} ₽".replace('.', ',', 1)
+        return f"{value:.0f} ₽"
+
+    def format(self) -> str:
+        """Текст в прежнем формате отчета: последний год и динамика по годам"""
+        if self.text:
+            return self.text
+
+        latest = self.latest
+        lines = []
+        if latest:
+            suffix = f" ({latest.year})" if latest.year else ""
+            lines.append(f"Выручка{suffix}: {self.format_amount(latest.revenue)}")
+            if latest.net_profit is not None:
+                lines.append(f"Чистая прибыль{suffix}: {self.format_amount(latest.net_profit)}")
+        if self.employees is not None:
+            lines.append(f"Сотрудники: {self.employees}")
+
+        history = [y for y in self.years if y.year and y.revenue is not None]
+        if len(history) > 1:
+            lines.append("Выручка по годам: " + "; ".join(
+                f"{y.year} — {self.format_amount(y.revenue)}" for y in history))
+        return "\n".join(lines)
+
+
+class FinancialsParser:
+    """Разбор финансовых показателей из JSON-ответов datanewton.ru.
+
+    Структура ответов API не документирована и меняется, поэтому поиск
+    идет по смыслу, а не по фиксированному пути: показатели узнаются
+    по именам полей или по кодам строк бухгалтерской отчетности
+    (2110 — выручка, 2400 — чистая прибыль), год — по ключу вида «2023»
+    или по полю year/period рядом со значением. Единица сумм берется из
+    поля okei/unit; без него строки отчетности по кодам считаются в тысячах
+    рублей, как в формах РСБУ (ОКЕИ 384), а поля по названиям — в рублях.
+    Объекты с полем inn другой компании (похожие организации, учредители)
+    пропускаются вместе с вложенными данными.
+    """
+    REVENUE = 'revenue'
+    NET_PROFIT = 'net_profit'
+    EMPLOYEES = 'employees'
+
+    METRIC_PATTERNS = {
+        REVENUE: re.compile(r'[a-z_]{0,6}2110|revenue|vyruchka|выручка'),
+        NET_PROFIT: re.compile(r'[a-z_]{0,6}2400|net_?profit|чистая прибыль'),
+        EMPLOYEES: re.compile(r'employees?(_count)?|employees_number|staff|sshr|сотрудники|'
+                              r'среднесписочная численность'),
+    }
+    YEAR_FIELDS = ('year', 'period', 'год')
+    NAME_FIELDS = ('code', 'name', 'title', 'key')
+    VALUE_FIELDS = ('value', 'sum', 'amount', 'current', 'val')
+    INN_FIELDS = ('inn', 'инн')
+    UNIT_FIELDS = ('okei', 'unit', 'units', 'measure', 'currency_unit', 'единица')
+    LINE_CODE_PATTERN = re.compile(r'[a-z_]{0,6}\d{4}')
+    # Разделы отчетности: по ним видно, что ответ — финансы компании, даже без выручки
+    FINANCE_SECTION_PATTERN = re.compile(r'financ\w*|fin_\w+|balance\w*|accounting\w*|'
+                                         r'otchet\w*|отчетност\w*|бухгалтер\w*')
+    # Строка целиком — число с необязательной единицей: «1 234,5 млн ₽», «120 чел.»
+    AMOUNT_PATTERN = re.compile(
+        r'\s*([-−]?\d[\d\s]*(?:[.,]\d+)?)\s*(?:(трлн|млрд|млн|тыс)\.?)?\s*'
+        r'(₽|руб\.?|рублей|чел\.?|человека?)?\s*',
+        re.IGNORECASE
+    )
+    MULTIPLIERS = {'тыс': 1e3, 'млн': 1e6, 'млрд': 1e9, 'трлн': 1e12}
+    OKEI_MULTIPLIERS = {'383': 1.0, '384': 1e3, '385': 1e6}
+    UNIT_MULTIPLIERS = (('трлн', 1e12), ('млрд', 1e9), ('млн', 1e6), ('million', 1e6), ('тыс', 1e3),
+                        ('thousand', 1e3), ('руб', 1.0), ('rub', 1.0))
+
+    @classmethod
+    def metric_for(cls, key: Any) -> Optional[str]:
+        name = str(key).strip().lower().replace('-', '_')
+        for metric, pattern in cls.METRIC_PATTERNS.items():
+            if pattern.fullmatch(name):
+                return metric
+        return None
+
+    @staticmethod
+    def as_year(value: Any) -> Optional[int]:
+        match = re.fullmatch(r'\s*((?:19|20)\d{2})(?:-\d{2}-\d{2})?\s*', str(value))
+        return int(match.group(1)) if match else None
+
+    @classmethod
+    def parse_amount(cls, value: Any) -> Optional[float]:
+        """Число из JSON или текста вида «1,2 млрд ₽»"""
+        if isinstance(value, bool) or value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        if not isinstance(value, str):
+            return None
+
+        match = cls.AMOUNT_PATTERN.fullmatch(value)
+        if not match:
+            return None
+        number = re.sub(r'\s', '', match.group(1)).replace(',', '.').replace('−', '-')
+        try:
+            amount = float(number)
+        except ValueError:
+            return None
+        unit = (match.group(2) or '').lower()
+        return amount * cls.MULTIPLIERS.get(unit, 1)
+
+    @classmethod
+    def _year_of(cls, item: Dict) -> Optional[int]:
+        for name in cls.YEAR_FIELDS:
+            if name in item:
+                year = cls.as_year(item[name])
+                if year:
+                    return year
+        return None
+
+    @classmethod
+    def _other_company(cls, node: Dict, inn: str) -> bool:
+        """Объект относится к другой компании: в нем указан чужой ИНН"""
+        for name in cls.INN_FIELDS:
+            if node.get(name) not in (None, '') and str(node[name]).strip() != inn:
+                return True
+        return False
+
+    @classmethod
+    def _scale_of(cls, node: Dict) -> Optional[float]:
+        """Множитель до рублей из поля единицы измерения (код ОКЕИ или текст)"""
+        for name in cls.UNIT_FIELDS:
+            if node.get(name) in (None, ''):
+                continue
+            unit = str(node[name]).strip().lower()
+            if unit in cls.OKEI_MULTIPLIERS:
+                return cls.OKEI_MULTIPLIERS[unit]
+            for word, multiplier in cls.UNIT_MULTIPLIERS:
+                if word in unit:
+                    return multiplier
+        return None
+
+    @classmethod
+    def _line_scale(cls, name: Any, scale: Optional[float]) -> float:
+        """Множитель показателя: указанная единица, иначе тысячи рублей для кодов строк"""
+        if scale is not None:
+            return scale
+        code = str(name).strip().lower().replace('-', '_')
+        return 1e3 if cls.LINE_CODE_PATTERN.fullmatch(code) else 1.0
+
+    @classmethod
+    def _has_unit(cls, value: Any) -> bool:
+        """Строка с единицей («1,2 млрд ₽») уже переведена в рубли и не масштабируется"""
+        match = cls.AMOUNT_PATTERN.fullmatch(value) if isinstance(value, str) else None
+        return bool(match and (match.group(2) or match.group(3)))
+
+    @classmethod
+    def _collect_values(cls, inn: str, metric: str, value: Any, year: Optional[int], scale: float,
+                        found: Dict[Tuple[str, Optional[int]], float]):
+        """Значения одного показателя: число, {год: число}, [{year, value}] или {value}"""
+        amount = cls.parse_amount(value)
+        if amount is not None:
+            if metric != cls.EMPLOYEES and not cls._has_unit(value):
+                amount *= scale
+            found.setdefault((metric, year), amount)
+            return
+
+        if isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    cls._collect_values(inn, metric, item, cls._year_of(item) or year, scale, found)
+            return
+
+        if not isinstance(value, dict) or cls._other_company(value, inn):
+            return
+
+        scale = cls._scale_of(value) or scale
+        for key, item in value.items():
+            key_year = cls.as_year(key)
+            if key_year:
+                cls._collect_values(inn, metric, item, key_year, scale, found)
+            elif str(key).lower() in cls.VALUE_FIELDS or str(key).lower() in ('values', 'years', 'data'):
+                cls._collect_values(inn, metric, item, cls._year_of(value) or year, scale, found)
+
+    @classmethod
+    def _walk(cls, inn: str, node: Any, year: Optional[int], scale: Optional[float],
+              found: Dict[Tuple[str, Optional[int]], float]):
+        if isinstance(node, list):
+            for item in node:
+                cls._walk(inn, item, year, scale, found)
+            return
+        if not isinstance(node, dict) or cls._other_company(node, inn):
+            return
+
+        year = cls._year_of(node) or year
+        scale = cls._scale_of(node) or scale
+
+        # Строка отчетности: {"code": "2110", "value": ...} или {"name": "Выручка", "2023": ...}
+        for name in cls.NAME_FIELDS:
+            metric = cls.metric_for(node[name]) if name in node else None
+            if metric:
+                cls._collect_values(inn, metric, node, year, cls._line_scale(node[name], scale), found)
+                break
+
+        for key, value in node.items():
+            metric = cls.metric_for(key)
+            if metric:
+                cls._collect_values(inn, metric, value, year, cls._line_scale(key, scale), found)
+                continue
+
+            key_year = cls.as_year(key)
+            cls._walk(inn, value, key_year or year, scale, found)
+
+    @classmethod
+    def _has_finance_section(cls, inn: str, node: Any) -> bool:
+        if isinstance(node, list):
+            return any(cls._has_finance_section(inn, item) for item in node)
+        if not isinstance(node, dict) or cls._other_company(node, inn):
+            return False
+
+        statements = (cls.REVENUE, cls.NET_PROFIT)
+        if any(name in node and cls.metric_for(node[name]) in statements for name in cls.NAME_FIELDS):
+            return True
+        for key, value in node.items():
+            if cls.metric_for(key) in statements or cls.FINANCE_SECTION_PATTERN.fullmatch(str(key).lower()):
+                return True
+            if cls._has_finance_section(inn, value):
+                return True
+        return False
+
+    @classmethod
+    def has_financials(cls, inn: str, payloads: List[Any]) -> bool:
+        """Есть ли в ответах финансовая отчетность этой компании, пусть и без выручки"""
+        return any(cls._has_finance_section(inn, payload) for payload in payloads)
+
+    @classmethod
+    def from_payload(cls, inn: str, payload: Any) -> Optional[CompanyFinancials]:
+        """Показатели из одного JSON-ответа; None, если выручки в ответе нет"""
+        found: Dict[Tuple[str, Optional[int]], float] = {}
+        cls._walk(inn, payload, None, None, found)
+        return cls._build(inn, found)
+
+    @classmethod
+    def from_payloads(cls, inn: str, payloads: List[Any]) -> Optional[CompanyFinancials]:
+        """Показатели из нескольких ответов страницы компании (отчетность и карточка)"""
+        found: Dict[Tuple[str, Optional[int]], float] = {}
+        for payload in payloads:
+            cls._walk(inn, payload, None, None, found)
+        return cls._build(inn, found)
+
+    @classmethod
+    def _build(cls, inn: str, found: Dict[Tuple[str, Optional[int]], float]) -> Optional[CompanyFinancials]:
+        if not any(metric == cls.REVENUE for metric, _ in found):
+            return None
+
+        years = sorted({year for metric, year in found if metric != cls.EMPLOYEES},
+                       key=lambda y: (y is not None, y or 0), reverse=True)
+        employees = [(year or 0, value) for (metric, year), value in found.items() if metric == cls.EMPLOYEES]
+
+        return CompanyFinancials(
+            inn=inn,
+            years=[
+                FinancialYear(year, found.get((cls.REVENUE, year)), found.get((cls.NET_PROFIT, year)))
+                for year in years
+            ],
+            employees=int(max(employees)[1]) if employees else None
+        )
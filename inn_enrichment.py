@@ -0,0 +1,217 @@
+import asyncio
+import csv
+import re
+import threading
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Dict, Set, Optional, Tuple, Callable, Awaitable
+
+import pandas as pd
+from cachetools import TTLCache
+
+from company_financials import CompanyFinancials
+from yandex_parser import SiteParser, TimeBudget
+
+
+class InnTools:
+    """Валидация ИНН и чтение списков ИНН из файлов"""
+    INN_PATTERN = re.compile(r'(?<!\d)(\d{12}|\d{10})(?!\d)')
+    SUPPORTED_EXTENSIONS = ('.xlsx', '.csv')
+    CSV_DELIMITERS = ',;\t|'
+
+    _WEIGHTS_10 = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+    _WEIGHTS_12_1 = (7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+    _WEIGHTS_12_2 = (3, 7, 2, 4, 10, 3, 5, 9, 4, 6, 8)
+
+    @staticmethod
+    def _checksum(digits: str, weights: Tuple[int, ...]) -> int:
+        return sum(int(d) * w for d, w in zip(digits, weights)) % 11 % 10
+
+    @classmethod
+    def is_valid_inn(cls, inn: str) -> bool:
+        """Проверка контрольных цифр ИНН юрлица (10 цифр) или ИП (12 цифр)"""
+        if not inn.isdigit():
+            return False
+        if len(inn) == 10:
+            return cls._checksum(inn, cls._WEIGHTS_10) == int(inn[9])
+        if len(inn) == 12:
+            return (cls._checksum(inn, cls._WEIGHTS_12_1) == int(inn[10]) and
+                    cls._checksum(inn, cls._WEIGHTS_12_2) == int(inn[11]))
+        return False
+
+    @classmethod
+    def is_supported_file(cls, filename: str) -> bool:
+        return (filename or '').lower().endswith(cls.SUPPORTED_EXTENSIONS)
+
+    @classmethod
+    def _cell_candidates(cls, value: str) -> List[str]:
+        """Кандидаты в ИНН из одной ячейки таблицы"""
+        value = value.strip()
+        if value.endswith('.0'):
+            value = value[:-2]
+
+        # Excel теряет ведущий ноль у ИНН, сохраненных числом
+        if value.isdigit() and len(value) in (9, 11):
+            return [value.zfill(len(value) + 1)]
+
+        return cls.INN_PATTERN.findall(value)
+
+    @classmethod
+    def _csv_delimiter(cls, content: bytes) -> str:
+        """Разделитель CSV; файл из одной колонки читается целиком построчно"""
+        sample = content[:64 * 1024].decode('utf-8', errors='ignore')
+        try:
+            return csv.Sniffer().sniff(sample, delimiters=cls.CSV_DELIMITERS).delimiter
+        except csv.Error:
+            # В одной колонке разделителей нет; \x1f не встречается в тексте
+            return '\x1f'
+
+    @classmethod
+    def read_inns(cls, content: bytes, filename: str) -> Tuple[List[str], int]:
+        """Чтение, валидация и дедупликация ИНН из xlsx/csv.
+
+        Возвращает уникальные корректные ИНН в порядке появления
+        и количество отброшенных некорректных значений.
+        """
+        if filename.lower().endswith('.csv'):
+            df = pd.read_csv(BytesIO(content), dtype=str, header=None,
+                             sep=cls._csv_delimiter(content), encoding_errors='ignore')
+        else:
+            df = pd.read_excel(BytesIO(content), dtype=str, header=None)
+
+        inns = {}
+        invalid = 0
+        for value in df.stack().dropna():
+            for candidate in cls._cell_candidates(str(value)):
+                if cls.is_valid_inn(candidate):
+                    inns.setdefault(candidate, None)
+                else:
+                    invalid += 1
+
+        return list(inns), invalid
+
+
+class RevenueCache:
+    """Потокобезопасный кэш финансовых данных по ИНН с ограничением по времени жизни"""
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 24 * 3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, inn: str) -> Optional[CompanyFinancials]:
+        with self._lock:
+            return self._cache.get(inn)
+
+    def set(self, inn: str, financials: Optional[CompanyFinancials]):
+        # Неудачные запросы не кэшируем, чтобы повторить их в следующий раз
+        if not financials:
+            return
+        with self._lock:
+            self._cache[inn] = financials
+
+
+@dataclass
+class EnrichmentProgress:
+    """Состояние пакетной обработки ИНН"""
+    total: int
+    done: int = 0
+    found: int = 0
+    cached: int = 0
+
+
+class BulkInnEnricher:
+    """Параллельное получение финансовых данных для списка ИНН.
+
+    Каждый воркер держит собственный SiteParser и выполняет блокирующие
+    запросы Selenium в отдельном потоке, не останавливая цикл событий бота.
+    Внутри браузера воркера ИНН запрашиваются группами в параллельных вкладках.
+    На каждую группу отводится не более inn_timeout секунд; ИНН, которые
+    группа не успела обработать, один раз возвращаются в очередь. При отмене
+    общего бюджета браузеры воркеров закрываются сразу.
+    """
+
+    def __init__(self, cache: RevenueCache, workers: int = 3, tabs_per_worker: int = 1,
+                 inn_timeout: Optional[float] = None):
+        self.cache = cache
+        self.workers = workers
+        self.tabs_per_worker = tabs_per_worker
+        self.inn_timeout = inn_timeout
+
+    async def _worker(self, queue: asyncio.Queue, results: Dict[str, Optional[str]],
+                      progress: EnrichmentProgress, on_progress, budget: TimeBudget, retried: Set[str]):
+        parser = None
+        try:
+            while not budget.cancelled and not budget.expired:
+                batch = []
+                while len(batch) < self.tabs_per_worker:
+                    try:
+                        batch.append(queue.get_nowait())
+                    except asyncio.QueueEmpty:
+                        break
+                if not batch:
+                    return
+
+                if parser is None:
+                    parser = await SiteParser.run_in_browser_thread(SiteParser, max_tabs=self.tabs_per_worker)
+                    budget.on_cancel(parser.close)
+
+                # В результат попадают только ИНН, которые парсер успел обработать
+                with budget.child(self.inn_timeout) as batch_budget:
+                    financials = await SiteParser.run_in_browser_thread(
+                        dict, parser.iter_company_financials(batch, batch_budget))
+                for inn, company in financials.items():
+                    self.cache.set(inn, company)
+                    revenue = company.format() if company else None
+                    results[inn] = revenue
+
+                    progress.done += 1
+                    if revenue:
+                        progress.found += 1
+
+                # Таймаут группы не должен стоить ИНН, пока общий бюджет задачи не исчерпан
+                if not budget.cancelled and not budget.expired:
+                    for inn in batch:
+                        if inn not in financials and inn not in retried:
+                            retried.add(inn)
+                            queue.put_nowait(inn)
+                if on_progress:
+                    await on_progress(progress)
+        except Exception as e:
+            print(f"Ошибка воркера обогащения ИНН: {str(e)}")
+        finally:
+            if parser is not None:
+                await SiteParser.run_in_browser_thread(parser.close)
+
+    async def enrich(self, inns: List[str],
+                     on_progress: Optional[Callable[[EnrichmentProgress], Awaitable[None]]] = None,
+                     budget: Optional[TimeBudget] = None) -> Dict[str, Optional[str]]:
+        """Финансовые данные по ИНН (None, если данные не найдены).
+
+        ИНН, которые не успели обработать до отмены или истечения бюджета,
+        а также со второй попытки после таймаута группы, в результат не попадают.
+        """
+        budget = budget or TimeBudget()
+        progress = EnrichmentProgress(total=len(inns))
+        results: Dict[str, Optional[str]] = {}
+        queue: asyncio.Queue = asyncio.Queue()
+        retried: Set[str] = set()
+
+        for inn in inns:
+            cached = self.cache.get(inn)
+            if cached:
+                results[inn] = cached.format()
+                progress.done += 1
+                progress.found += 1
+                progress.cached += 1
+            else:
+                queue.put_nowait(inn)
+
+        if on_progress:
+            await on_progress(progress)
+
+        workers = min(self.workers, -(-queue.qsize() // self.tabs_per_worker))
+        await asyncio.gather(*(
+            self._worker(queue, results, progress, on_progress, budget, retried) for _ in range(workers)
+        ))
+
+        return {inn: results[inn] for inn in inns if inn in results}
@@ -0,0 +1,479 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional
+
+from aiohttp import web
+
+BOT_TOKEN = "123456:LOADTEST"
+ADMIN_ID = 1
+FIRST_USER_ID = 1000
+
+
+@dataclass
+class UserStats:
+    """Замеры одного запроса виртуального пользователя"""
+    user_id: int
+    sent_at: float
+    started_at: Optional[float] = None
+    first_site_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    messages: int = 0
+    error: Optional[str] = None
+
+    @property
+    def latency(self) -> Optional[float]:
+        return self.finished_at - self.sent_at if self.finished_at else None
+
+    @property
+    def queue_wait(self) -> Optional[float]:
+        return self.started_at - self.sent_at if self.started_at else None
+
+    @property
+    def first_result(self) -> Optional[float]:
+        return self.first_site_at - self.sent_at if self.first_site_at else None
+
+
+class FakeTelegramAPI:
+    """Заглушка Bot API: long polling getUpdates и запись всех ответов бота"""
+
+    def __init__(self):
+        self.updates: List[Dict] = []
+        self.new_update = asyncio.Condition()
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.calls = Counter()
+        self.delivered: Dict[int, float] = {}
+        self.listeners: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post(r'/bot{token}/{method}', self.handle)
+        return app
+
+    async def push_message(self, user_id: int, text: str) -> int:
+        update_id = next(self.update_ids)
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"},
+            'text': text
+        }
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+
+        async with self.new_update:
+            self.updates.append({'update_id': update_id, 'message': message})
+            self.new_update.notify_all()
+        return update_id
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get('offset') or 0)
+        timeout = float(params.get('timeout') or 0)
+        async with self.new_update:
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            if not self.updates and timeout:
+                try:
+                    await asyncio.wait_for(self.new_update.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            now = time.perf_counter()
+            for update in self.updates:
+                self.delivered.setdefault(update['update_id'], now)
+            return list(self.updates)
+
+    def _bot_message(self, chat_id: int, **fields) -> Dict:
+        return {
+            'message_id': fields.pop('message_id', None) or next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'first_name': "Bot"},
+            **fields
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = dict(await request.post())
+        self.calls[method] += 1
+
+        if method == 'getme':
+            result = {'id': 1, 'is_bot': True, 'first_name': "Bot", 'username': "load_test_bot"}
+        elif method == 'getupdates':
+            result = await self._get_updates(params)
+        elif method in ('sendmessage', 'editmessagetext', 'senddocument'):
+            chat_id = int(params['chat_id'])
+            if method == 'senddocument':
+                result = self._bot_message(chat_id, caption=params.get('caption', ''), document={
+                    'file_id': 'document', 'file_unique_id': 'document', 'file_name': 'report.xlsx'})
+            else:
+                result = self._bot_message(
+                    chat_id, text=params.get('text', ''), message_id=int(params.get('message_id') or 0))
+            self.listeners[chat_id].put_nowait((time.perf_counter(), method, result))
+        else:
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+
+class FakeSites:
+    """Сайты конкурентов и копия разметки datanewton.ru с настраиваемыми задержками"""
+
+    def __init__(self, site_delay: float, revenue_delay: float):
+        self.site_delay = site_delay
+        self.revenue_delay = revenue_delay
+
+    @staticmethod
+    def site_inn(site_id: int) -> str:
+        """Корректный ИНН юрлица, уникальный для сайта"""
+        digits = f"77{site_id:07d}"[-9:]
+        weights = (2, 4, 10, 3, 5, 9, 4, 6, 8)
+        control = sum(int(d) * w for d, w in zip(digits, weights)) % 11 % 10
+        return f"{digits}{control}"
+
+    @staticmethod
+    def site_phone(site_id: int) -> str:
+        number = f"{site_id % 10 ** 7:07d}"
+        return f"+7 (495) {number[:3]}-{number[3:5]}-{number[5:]}"
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/site/{site_id}', self.site)
+        app.router.add_get('/search', self.search)
+        app.router.add_get('/company/{inn}', self.company)
+        app.router.add_get('/api/company/{inn}/finance', self.finance)
+        return app
+
+    @staticmethod
+    def _html(body: str) -> web.Response:
+        return web.Response(text=f"<html><body>{body}</body></html>", content_type='text/html')
+
+    async def site(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.site_delay)
+        site_id = int(request.match_info['site_id'])
+        return self._html(
+            f"<h1>Компания {site_id}</h1>"
+            f"<p>Телефон: <a href=\"tel:{self.site_phone(site_id)}\">{self.site_phone(site_id)}</a></p>"
+            f"<footer>ООО «Компания {site_id}», ИНН {self.site_inn(site_id)}</footer>"
+        )
+
+    async def search(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.revenue_delay / 2)
+        inn = request.query.get('query', '').strip()
+        return self._html(
+            "<div class=\"list-group list-group-flush\">"
+            f"<a class=\"list-group-item\" href=\"/company/{inn}\">ООО «Компания», ИНН {inn}</a>"
+            "</div>"
+        )
+
+    @staticmethod
+    def revenue(inn: str, year: int) -> float:
+        return int(inn[-6:]) * 1000 * (1 + (year - 2020) / 10)
+
+    async def company(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self.revenue_delay / 2)
+        inn = request.match_info['inn']
+        revenue = self.revenue(inn, 2023) / 1e6
+        # Разметка для чтения со страницы и запрос JSON, как у настоящего сайта
+        return self._html(
+            f"<div><div>Выручка</div><div>{revenue:.1f} млн ₽</div></div>"
+            f"<div><div>Чистая прибыль</div><div>{revenue / 10:.1f} млн ₽</div></div>"
+            "<div><div>Сотрудники</div><div>42</div></div>"
+            f"<script>fetch('/api/company/{inn}/finance')</script>"
+        )
+
+    async def finance(self, request: web.Request) -> web.Response:
+        inn = request.match_info['inn']
+        years = range(2021, 2024)
+        # Строки отчетности в тысячах рублей, как в формах РСБУ
+        return web.json_response({
+            'inn': inn,
+            'finance': {
+                '2110': {str(year): self.revenue(inn, year) / 1000 for year in years},
+                '2400': {str(year): self.revenue(inn, year) / 10000 for year in years}
+            },
+            'employees': [{'year': 2023, 'value': 42}]
+        })
+
+
+class ResourceSampler:
+    """Периодический замер CPU и памяти процесса вместе с дочерними браузерами (Linux /proc)"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.peak_rss_mb = 0.0
+        self.peak_processes = 0
+        self.rss_samples: List[float] = []
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self._clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._cpu_seen: Dict[int, float] = {}
+
+    def _process_tree(self) -> List[int]:
+        children = defaultdict(list)
+        for name in os.listdir('/proc'):
+            if not name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{name}/stat') as f:
+                    stat = f.read()
+                ppid = int(stat.rsplit(')', 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children[ppid].append(int(name))
+
+        tree, stack = [], [os.getpid()]
+        while stack:
+            pid = stack.pop()
+            tree.append(pid)
+            stack.extend(children.get(pid, []))
+        return tree
+
+    def sample(self):
+        rss = 0
+        processes = self._process_tree()
+        for pid in processes:
+            try:
+                with open(f'/proc/{pid}/statm') as f:
+                    rss += int(f.read().split()[1]) * self._page_size
+                with open(f'/proc/{pid}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                # utime и stime — 14 и 15 поля stat, после имени процесса — индексы 11 и 12
+                self._cpu_seen[pid] = (int(fields[11]) + int(fields[12])) / self._clock_ticks
+            except (OSError, ValueError, IndexError):
+                continue
+
+        self.peak_processes = max(self.peak_processes, len(processes))
+        rss_mb = rss / 1024 / 1024
+        self.rss_samples.append(rss_mb)
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+
+    @property
+    def cpu_seconds(self) -> float:
+        """CPU процесса и всех браузеров, замеченных за время теста"""
+        return sum(self._cpu_seen.values())
+
+    async def run(self):
+        if not os.path.isdir('/proc'):
+            return
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        'p50': percentile(values, 50),
+        'p90': percentile(values, 90),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+        'mean': statistics.mean(values) if values else None
+    }
+
+
+async def run_user(api: FakeTelegramAPI, user_id: int, urls: List[str], timeout: float) -> UserStats:
+    """Сценарий виртуального пользователя: /start, затем список URL до получения отчета"""
+    inbox = api.listeners[user_id]
+
+    await api.push_message(user_id, "/start")
+    await asyncio.wait_for(inbox.get(), timeout)
+
+    update_id = await api.push_message(user_id, "\n".join(urls))
+    stats = UserStats(user_id=user_id, sent_at=time.perf_counter())
+    deadline = time.perf_counter() + timeout
+
+    while True:
+        try:
+            at, method, message = await asyncio.wait_for(inbox.get(), max(0.0, deadline - time.perf_counter()))
+        except asyncio.TimeoutError:
+            stats.error = stats.error or "timeout"
+            break
+
+        stats.messages += 1
+        text = message.get('text', '')
+
+        if method == 'senddocument':
+            stats.finished_at = at
+            break
+        if stats.started_at is None and "Анализирую" in text:
+            stats.started_at = at
+        elif stats.first_site_at is None and "Сайт #" in text:
+            stats.first_site_at = at
+        elif "Ошибка" in text and "Сайт #" not in text:
+            # После ошибки бот может еще прислать частичный отчет
+            stats.error = text.splitlines()[0]
+            deadline = min(deadline, time.perf_counter() + 5)
+
+    # Момент выдачи обновления боту точнее момента постановки в очередь
+    stats.sent_at = api.delivered.get(update_id, stats.sent_at)
+    return stats
+
+
+def configure_environment(args, workdir: str, api_url: str, sites_url: str):
+    """Настройки бота задаются до импорта parser, так как Config читается при импорте"""
+    user_ids = range(FIRST_USER_ID, FIRST_USER_ID + args.users)
+    os.environ.update({
+        'BOT_TOKEN': BOT_TOKEN,
+        'TELEGRAM_API_URL': api_url,
+        'DATANEWTON_URL': sites_url,
+        'ADMIN_IDS': str(ADMIN_ID),
+        'ALLOWED_USER_IDS': ",".join(map(str, user_ids)),
+        'RESULTS_DB': os.path.join(workdir, 'results.db'),
+        'WATCHLIST_DB': os.path.join(workdir, 'watchlist.db'),
+        'BROWSER_PROFILES_DIR': os.path.join(workdir, 'browser_profiles'),
+        'BROWSER_MEMORY_BUDGET_MB': str(args.memory_budget),
+    })
+
+
+async def main(args) -> Dict:
+    """Прогон нагрузочного теста.
+
+    Бот запускается в этом же процессе и получает обновления от заглушки
+    Bot API, сайты конкурентов и datanewton.ru отдаются локальным HTTP-сервером.
+    Браузеры Chrome настоящие, поэтому измеряется полный путь запроса:
+    очередь, Selenium, отправка отчетов.
+    """
+    api = FakeTelegramAPI()
+    sites = FakeSites(args.site_delay, args.revenue_delay)
+
+    runners = []
+    for app, port in ((api.app(), args.api_port), (sites.app(), args.sites_port)):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        runners.append(runner)
+    api_port = runners[0].addresses[0][1]
+    sites_port = runners[1].addresses[0][1]
+    sites_url = f"http://127.0.0.1:{sites_port}"
+
+    workdir = tempfile.mkdtemp(prefix='load_test_')
+    configure_environment(args, workdir, f"http://127.0.0.1:{api_port}", sites_url)
+
+    from parser import CompetitorAnalyzerBot, Config
+    Config.MAX_CONCURRENT_REQUESTS = args.concurrency
+    Config.MAX_URLS_PER_REQUEST = max(Config.MAX_URLS_PER_REQUEST, args.urls)
+
+    bot = CompetitorAnalyzerBot()
+    polling = asyncio.create_task(bot.dp.start_polling(bot.bot, handle_signals=False))
+    sampler = ResourceSampler()
+    sampling = asyncio.create_task(sampler.run())
+
+    site_ids = itertools.count(1)
+    started = time.perf_counter()
+
+    async def delayed_user(n: int, user_id: int) -> UserStats:
+        await asyncio.sleep(args.ramp * n / max(1, args.users))
+        urls = [f"{sites_url}/site/{next(site_ids)}" for _ in range(args.urls)]
+        try:
+            return await run_user(api, user_id, urls, args.timeout)
+        except Exception as e:
+            return UserStats(user_id=user_id, sent_at=time.perf_counter(), error=str(e) or type(e).__name__)
+
+    try:
+        results = await asyncio.gather(*(
+            delayed_user(n, FIRST_USER_ID + n) for n in range(args.users)
+        ))
+    finally:
+        elapsed = time.perf_counter() - started
+        sampler.sample()
+        sampling.cancel()
+        await bot.dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+        await bot.bot.session.close()
+        for runner in runners:
+            await runner.cleanup()
+
+    completed = [r for r in results if r.latency is not None and not r.error]
+    bot_messages = api.calls['sendmessage'] + api.calls['editmessagetext'] + api.calls['senddocument']
+    return {
+        'label': args.label,
+        'parameters': {
+            'users': args.users,
+            'urls_per_user': args.urls,
+            'concurrency': args.concurrency,
+            'memory_budget_mb': args.memory_budget,
+            'tabs_per_browser': bot.tabs_per_browser,
+            'site_delay': args.site_delay,
+            'revenue_delay': args.revenue_delay,
+            'ramp': args.ramp
+        },
+        'elapsed': elapsed,
+        'completed': len(completed),
+        'failed': len(results) - len(completed),
+        'errors': dict(Counter(r.error for r in results if r.error)),
+        'latency': summarize([r.latency for r in completed]),
+        'queue_wait': summarize([r.queue_wait for r in results if r.queue_wait is not None]),
+        'first_result': summarize([r.first_result for r in results if r.first_result is not None]),
+        'sites_per_sec': len(completed) * args.urls / elapsed if elapsed else 0.0,
+        'messages_per_sec': bot_messages / elapsed if elapsed else 0.0,
+        'api_calls': dict(api.calls),
+        'peak_rss_mb': sampler.peak_rss_mb,
+        'mean_rss_mb': statistics.mean(sampler.rss_samples) if sampler.rss_samples else None,
+        'peak_processes': sampler.peak_processes,
+        'cpu_seconds': sampler.cpu_seconds,
+        'users': [asdict(r) for r in results]
+    }
+
+
+def print_report(report: Dict):
+    def fmt(value: Optional[float]) -> str:
+        return "—" if value is None else f"{value:.2f}"
+
+    params = report['parameters']
+    print(f"\nНагрузочный тест {report['label'] or ''}".rstrip())
+    print(f"Пользователи: {params['users']}, URL на пользователя: {params['urls_per_user']}, "
+          f"параллельных запросов: {params['concurrency']}, вкладок на браузер: {params['tabs_per_browser']}")
+    print(f"Время теста: {report['elapsed']:.1f} с, завершено: {report['completed']}, ошибок: {report['failed']}")
+    for error, count in report['errors'].items():
+        print(f"  {error}: {count}")
+
+    print(f"\n{'секунды':<24}{'p50':>8}{'p90':>8}{'p99':>8}{'max':>8}")
+    for title, key in (("Полный запрос", 'latency'), ("Ожидание в очереди", 'queue_wait'),
+                       ("Первый сайт", 'first_result')):
+        row = report[key]
+        print(f"{title:<24}{fmt(row['p50']):>8}{fmt(row['p90']):>8}{fmt(row['p99']):>8}{fmt(row['max']):>8}")
+
+    print(f"\nСайтов в секунду: {report['sites_per_sec']:.2f}")
+    print(f"Сообщений бота в секунду: {report['messages_per_sec']:.2f}")
+    print(f"Пиковая память (с браузерами): {report['peak_rss_mb']:.0f} МБ, "
+          f"процессов: {report['peak_processes']}, CPU: {report['cpu_seconds']:.1f} с")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальной заглушке Bot API")
+    arg_parser.add_argument('--users', type=int, default=5, help="число виртуальных пользователей")
+    arg_parser.add_argument('--urls', type=int, default=3, help="URL в запросе каждого пользователя")
+    arg_parser.add_argument('--concurrency', type=int, default=3, help="Config.MAX_CONCURRENT_REQUESTS")
+    arg_parser.add_argument('--memory-budget', type=int, default=1024,
+                            help="BROWSER_MEMORY_BUDGET_MB, определяет число вкладок")
+    arg_parser.add_argument('--site-delay', type=float, default=0.5, help="задержка ответа сайта, с")
+    arg_parser.add_argument('--revenue-delay', type=float, default=1.0, help="задержка datanewton на ИНН, с")
+    arg_parser.add_argument('--ramp', type=float, default=0.0, help="за сколько секунд подключаются все пользователи")
+    arg_parser.add_argument('--timeout', type=float, default=900, help="предельное время запроса пользователя, с")
+    arg_parser.add_argument('--api-port', type=int, default=0)
+    arg_parser.add_argument('--sites-port', type=int, default=0)
+    arg_parser.add_argument('--label', default="", help="метка прогона для сравнения результатов")
+    arg_parser.add_argument('--json', help="сохранить результаты в JSON")
+    args = arg_parser.parse_args()
+
+    report = asyncio.run(main(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
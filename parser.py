@@ -1,17 +1,26 @@
 import asyncio
+import html
 import os
 import re
 from typing import List, Dict, Set, Optional
 from collections import defaultdict
 import pandas as pd
 from io import BytesIO
-from aiogram import Bot, Dispatcher, types
+import time
+from aiogram import Bot, Dispatcher, F, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command
 from aiogram.types import Message, BufferedInputFile
 from aiogram.enums import ParseMode
 from dotenv import load_dotenv
 
-from yandex_parser import SiteParser
+from company_financials import CompanyFinancials
+from yandex_parser import SiteParser, TimeBudget, PhonesFound, InnsFound, SiteDone
+from inn_enrichment import InnTools, RevenueCache, BulkInnEnricher, EnrichmentProgress
+from watchlist import WatchlistStore, WatchlistScheduler, WatchDiff
+from results_store import ResultsStore
+from phone_numbering import NumberingPlan
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -20,11 +29,31 @@ load_dotenv()
 class Config:
     """Конфигурация бота и безопасность"""
     BOT_TOKEN: str = os.getenv("BOT_TOKEN", "")
+    # Локальный Bot API сервер, например http://localhost:8081 (пусто — api.telegram.org)
+    TELEGRAM_API_URL: str = os.getenv("TELEGRAM_API_URL", "")
     ADMIN_IDS: Set[int] = set(map(int, os.getenv("ADMIN_IDS", "").split(",")))
     ALLOWED_USER_IDS: Set[int] = set(map(int, os.getenv("ALLOWED_USER_IDS", "").split(",")))
     MAX_CONCURRENT_REQUESTS: int = 3
     MAX_URLS_PER_REQUEST: int = 10
     BLACKLISTED_DOMAINS: Set[str] = {"example.com", "test.com"}
+    MAX_INNS_PER_FILE: int = 5000
+    MAX_UPLOAD_SIZE_MB: int = 10
+    MAX_BULK_JOBS: int = 2
+    BULK_WORKERS: int = 3
+    REVENUE_CACHE_TTL: int = 24 * 3600
+    PROGRESS_UPDATE_INTERVAL: int = 5
+    RESULTS_DB: str = os.getenv("RESULTS_DB", "results.db")
+    MAX_SEARCH_RESULTS: int = 20
+    REQUEST_TIMEOUT: int = 15 * 60
+    URL_TIMEOUT: int = 120
+    BULK_REQUEST_TIMEOUT: int = 6 * 3600
+    INN_TIMEOUT: int = 90
+    WATCH_URL_TIMEOUT: int = 180
+    BROWSER_MEMORY_BUDGET_MB: int = int(os.getenv("BROWSER_MEMORY_BUDGET_MB", "1024"))
+    WATCHLIST_DB: str = os.getenv("WATCHLIST_DB", "watchlist.db")
+    MAX_WATCHES_PER_USER: int = 50
+    WATCH_INTERVAL: int = 7 * 24 * 3600
+    WATCH_REVENUE_REFRESH: int = 30 * 24 * 3600
 
 
 class Emojis:
@@ -52,6 +81,9 @@ class Emojis:
     USER_REMOVE = "👤➖"
     LIST = "📜"
     INFO = "ℹ️"
+    EYE = "👁"
+    PLUS = "➕"
+    MINUS = "➖"
 
 
 class UserManager:
@@ -102,6 +134,46 @@ class ParserTools:
             return f"{Emojis.WARNING} Информация о выручке не найдена"
         return "\n".join(f"➖ ИНН {inn}: {revenue}" for inn, revenue in revenue_data.items())
 
+    @staticmethod
+    def _report_status(item: Dict) -> str:
+        if item['skipped']:
+            return 'Пропущен'
+        return 'Прерван' if item.get('timed_out') else 'Обработан'
+
+    @staticmethod
+    def describe_phone(phone: str) -> str:
+        info = NumberingPlan.default().lookup(phone)
+        if not info:
+            return phone
+        details = ", ".join(filter(None, [info.kind_title, info.operator, info.region]))
+        return f"{phone} <i>({details})</i>"
+
+    @staticmethod
+    def _phone_columns(phone: str) -> Dict[str, str]:
+        info = NumberingPlan.default().lookup(phone)
+        return {
+            'Тип номера': info.kind_title if info else '',
+            'Регион': (info.region or '') if info else '',
+            'Оператор': (info.operator or '') if info else ''
+        }
+
+    @staticmethod
+    async def format_site_report(index: int, contacts: Dict) -> str:
+        site_report = [
+            f"\n{Emojis.CHECK} <b>Сайт #{index}:</b> <code>{contacts['url']}</code>",
+            f"\n{Emojis.PHONE} <b>Телефоны:</b>\n" +
+            "\n".join(f"➖ {ParserTools.describe_phone(p)}" for p in contacts['phones']) if
+            contacts['phones'] else f"\n{Emojis.WARNING} Телефоны не найдены",
+            f"\n{Emojis.INN} <b>ИНН:</b>\n" + "\n".join(f"➖ {inn}" for inn in contacts['inns']) if
+            contacts['inns'] else f"\n{Emojis.WARNING} ИНН не найдены",
+            f"\n{Emojis.MONEY} <b>Финансовые данные:</b>\n" +
+            await ParserTools.format_revenue(contacts['revenues']) if
+            contacts['revenues'] else ""
+        ]
+        if contacts.get('timed_out'):
+            site_report.append(f"\n{Emojis.WAIT} <i>Обработка прервана, данные могут быть неполными</i>")
+        return "\n".join(site_report)
+
     @staticmethod
     async def create_excel_report(data: List[Dict]) -> BufferedInputFile:
         rows = []
@@ -113,7 +185,8 @@ class ParserTools:
                         'Телефон': phone,
                         'ИНН': inn,
                         'Выручка': item['revenues'].get(inn, 'Нет данных'),
-                        'Статус': 'Пропущен' if item['skipped'] else 'Обработан'
+                        'Статус': ParserTools._report_status(item),
+                        **ParserTools._phone_columns(phone)
                     })
 
             if item['phones'] and not item['inns']:
@@ -123,7 +196,8 @@ class ParserTools:
                         'Телефон': phone,
                         'ИНН': 'Не найден',
                         'Выручка': 'Нет данных',
-                        'Статус': 'Пропущен' if item['skipped'] else 'Обработан'
+                        'Статус': ParserTools._report_status(item),
+                        **ParserTools._phone_columns(phone)
                     })
 
             if item['inns'] and not item['phones']:
@@ -133,7 +207,8 @@ class ParserTools:
                         'Телефон': 'Не найден',
                         'ИНН': inn,
                         'Выручка': item['revenues'].get(inn, 'Нет данных'),
-                        'Статус': 'Пропущен' if item['skipped'] else 'Обработан'
+                        'Статус': ParserTools._report_status(item),
+                        **ParserTools._phone_columns('')
                     })
 
         df = pd.DataFrame(rows)
@@ -146,20 +221,157 @@ class ParserTools:
             worksheet.set_column('C:C', 15)
             worksheet.set_column('D:D', 30)
             worksheet.set_column('E:E', 12)
-            worksheet.autofilter(0, 0, 0, 4)
+            worksheet.set_column('F:F', 12)
+            worksheet.set_column('G:G', 30)
+            worksheet.set_column('H:H', 25)
+            worksheet.autofilter(0, 0, 0, 7)
 
         return BufferedInputFile(output.getvalue(), filename="Результаты_анализа.xlsx")
 
+    @staticmethod
+    async def create_inn_report(inns: List[str], revenues: Dict[str, Optional[str]]) -> BufferedInputFile:
+        rows = []
+        for inn in inns:
+            revenue = revenues.get(inn)
+            if inn not in revenues:
+                status = 'Не обработан'
+            else:
+                status = 'Найдено' if revenue else 'Не найдено'
+            rows.append({
+                'ИНН': inn,
+                'Финансовые данные': revenue or 'Нет данных',
+                'Статус': status
+            })
+
+        df = pd.DataFrame(rows, columns=['ИНН', 'Финансовые данные', 'Статус'])
+        output = BytesIO()
+        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            df.to_excel(writer, index=False)
+            worksheet = writer.sheets['Sheet1']
+            worksheet.set_column('A:A', 15)
+            worksheet.set_column('B:B', 50)
+            worksheet.set_column('C:C', 12)
+            worksheet.autofilter(0, 0, 0, 2)
+
+        return BufferedInputFile(output.getvalue(), filename="Обогащение_ИНН.xlsx")
+
+    @staticmethod
+    async def create_store_export(rows: List[Dict]) -> BufferedInputFile:
+        df = pd.DataFrame(rows, columns=['URL', 'Телефон', 'ИНН', 'Выручка', 'Дата проверки'])
+        output = BytesIO()
+        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            df.to_excel(writer, index=False)
+            worksheet = writer.sheets['Sheet1']
+            worksheet.set_column('A:A', 40)
+            worksheet.set_column('B:B', 20)
+            worksheet.set_column('C:C', 15)
+            worksheet.set_column('D:D', 30)
+            worksheet.set_column('E:E', 17)
+            worksheet.autofilter(0, 0, 0, 4)
+
+        return BufferedInputFile(output.getvalue(), filename="Архив_результатов.xlsx")
+
+    @staticmethod
+    async def format_search_results(found: Dict) -> str:
+        def date(ts: float) -> str:
+            return time.strftime('%d.%m.%Y', time.localtime(ts))
+
+        # Запрос введен пользователем, домены и тексты взяты с сайтов: экранируем для HTML
+        query = html.escape(found['query'])
+
+        if found['type'] == 'domain':
+            if not found['checks']:
+                return f"{Emojis.WARNING} По домену <code>{query}</code> ничего не найдено"
+            lines = [
+                f"{Emojis.SEARCH} <b>Домен:</b> <code>{query}</code>",
+                f"{Emojis.TIME} Проверок: {found['checks']}, последняя {date(found['last_seen'])}",
+                f"\n{Emojis.PHONE} <b>Телефоны:</b>\n" + "\n".join(f"➖ {p}" for p in found['phones'])
+                if found['phones'] else f"\n{Emojis.WARNING} Телефоны не найдены",
+                f"\n{Emojis.INN} <b>ИНН:</b>\n" + "\n".join(f"➖ {inn}" for inn in found['inns'])
+                if found['inns'] else f"\n{Emojis.WARNING} ИНН не найдены",
+            ]
+            revenues = {inn: revenue for inn, revenue in found['revenues'].items() if revenue}
+            if revenues:
+                lines.append(f"\n{Emojis.MONEY} <b>Финансовые данные:</b>\n" +
+                             await ParserTools.format_revenue(revenues))
+            return "\n".join(lines)
+
+        if found['type'] == 'phone':
+            lines = [f"{Emojis.PHONE} <b>Телефон</b> {ParserTools.describe_phone(found['query'])}"]
+        else:
+            lines = [f"{Emojis.INN} <b>ИНН</b> <code>{query}</code>"]
+        if found.get('revenue'):
+            lines.append(f"{Emojis.MONEY} {html.escape(found['revenue'])}")
+
+        sites = found['sites']
+        if not sites:
+            lines.append(f"\n{Emojis.WARNING} На проверенных сайтах не встречался")
+            return "\n".join(lines)
+
+        lines.append(f"\n{Emojis.LIST} <b>Сайты ({len(sites)}):</b>")
+        lines.extend(
+            f"➖ <code>{html.escape(site['domain'])}</code> ({date(site['first_seen'])} — {date(site['last_seen'])})"
+            for site in sites[:Config.MAX_SEARCH_RESULTS]
+        )
+        if len(sites) > Config.MAX_SEARCH_RESULTS:
+            lines.append(f"<i>и еще {len(sites) - Config.MAX_SEARCH_RESULTS}</i>")
+        return "\n".join(lines)
+
+    @staticmethod
+    async def format_watch_diff(diff: WatchDiff) -> str:
+        lines = [f"{Emojis.EYE} <b>Изменения на сайте:</b> <code>{diff.url}</code>"]
+        if diff.added_phones or diff.removed_phones:
+            lines.append(f"\n{Emojis.PHONE} <b>Телефоны:</b>")
+            lines.extend(f"{Emojis.PLUS} {p}" for p in diff.added_phones)
+            lines.extend(f"{Emojis.MINUS} <s>{p}</s>" for p in diff.removed_phones)
+        if diff.added_inns or diff.removed_inns:
+            lines.append(f"\n{Emojis.INN} <b>ИНН:</b>")
+            lines.extend(f"{Emojis.PLUS} {inn}" for inn in diff.added_inns)
+            lines.extend(f"{Emojis.MINUS} <s>{inn}</s>" for inn in diff.removed_inns)
+        if diff.revenue_changes:
+            lines.append(f"\n{Emojis.MONEY} <b>Финансовые данные:</b>")
+            lines.extend(
+                f"➖ ИНН {inn}:\n<i>было:</i> {CompanyFinancials.format_amount(old)}\n"
+                f"<i>стало:</i> {CompanyFinancials.format_amount(new)}"
+                for inn, (old, new) in diff.revenue_changes.items()
+            )
+        return "\n".join(lines)
+
 
 class CompetitorAnalyzerBot:
     """Основной класс бота для анализа конкурентов"""
 
     def __init__(self):
-        self.bot = Bot(token=Config.BOT_TOKEN)
+        session = None
+        if Config.TELEGRAM_API_URL:
+            session = AiohttpSession(api=TelegramAPIServer.from_base(Config.TELEGRAM_API_URL))
+        self.bot = Bot(token=Config.BOT_TOKEN, session=session)
         self.dp = Dispatcher()
         self.user_sessions = {}
         self.active_requests = defaultdict(int)
+        self.active_jobs: Dict[int, Set[TimeBudget]] = defaultdict(set)
         self.request_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_REQUESTS)
+        self.bulk_semaphore = asyncio.Semaphore(Config.MAX_BULK_JOBS)
+        self.revenue_cache = RevenueCache(ttl=Config.REVENUE_CACHE_TTL)
+        self.results_store = ResultsStore(Config.RESULTS_DB)
+        self.tabs_per_browser = SiteParser.tabs_for_memory(Config.BROWSER_MEMORY_BUDGET_MB)
+        # Поток на каждый запрос URL, воркер пакетной обработки и планировщик отслеживания;
+        # отмена, поиск и сохранение результатов остаются в пуле asyncio по умолчанию
+        SiteParser.configure_browser_threads(
+            Config.MAX_CONCURRENT_REQUESTS + Config.MAX_BULK_JOBS * Config.BULK_WORKERS + 1)
+        self.enricher = BulkInnEnricher(
+            self.revenue_cache, workers=Config.BULK_WORKERS, tabs_per_worker=self.tabs_per_browser,
+            inn_timeout=Config.INN_TIMEOUT)
+        self.watch_scheduler = WatchlistScheduler(
+            WatchlistStore(Config.WATCHLIST_DB),
+            notify=self._notify_watch_diff,
+            interval=Config.WATCH_INTERVAL,
+            revenue_refresh=Config.WATCH_REVENUE_REFRESH,
+            revenue_cache=self.revenue_cache,
+            max_tabs=self.tabs_per_browser,
+            results_store=self.results_store,
+            url_timeout=Config.WATCH_URL_TIMEOUT
+        )
 
         # Регистрация обработчиков
         self._register_handlers()
@@ -168,16 +380,23 @@ class CompetitorAnalyzerBot:
         """Регистрация всех обработчиков команд"""
         self.dp.message.register(self._start_handler, Command("start"))
         self.dp.message.register(self._help_handler, Command("help"))
+        self.dp.message.register(self._cancel_handler, Command("cancel"))
         self.dp.message.register(self._add_user_handler, Command("add_user"))
         self.dp.message.register(self._remove_user_handler, Command("remove_user"))
         self.dp.message.register(self._list_users_handler, Command("list_users"))
+        self.dp.message.register(self._watch_handler, Command("watch"))
+        self.dp.message.register(self._unwatch_handler, Command("unwatch"))
+        self.dp.message.register(self._watchlist_handler, Command("watchlist"))
+        self.dp.message.register(self._search_handler, Command("search"))
+        self.dp.message.register(self._export_handler, Command("export"))
+        self.dp.message.register(self._document_handler, F.document)
         self.dp.message.register(self._main_handler)
 
     async def _send_message(self, chat_id: int, text: str, **kwargs):
         """Универсальный метод отправки сообщений"""
         await self.bot.send_message(chat_id, text, parse_mode=ParseMode.HTML, **kwargs)
 
-    async def _process_urls(self, message: Message, urls: List[str]):
+    async def _process_urls(self, message: Message, urls: List[str], budget: TimeBudget):
         """Обработка списка URL"""
         processing_msg = await message.answer(
             f"{Emojis.TIME} <b>Анализирую {len(urls)} сайтов...</b>\n"
@@ -185,21 +404,64 @@ class CompetitorAnalyzerBot:
             parse_mode=ParseMode.HTML
         )
 
-        all_results = []
         try:
-            with SiteParser() as parser:
+            parser = await SiteParser.run_in_browser_thread(
+                SiteParser, revenue_cache=self.revenue_cache, max_tabs=self.tabs_per_browser)
+            # При отмене браузер закрывается сразу, прерывая текущие запросы драйвера
+            budget.on_cancel(parser.close)
+            try:
+                numbered_urls = []
                 for i, url in enumerate(urls, 1):
-                    try:
-                        domain = re.search(r'https?://([^/]+)', url).group(1)
-                        if domain in Config.BLACKLISTED_DOMAINS:
-                            await message.answer(
-                                f"{Emojis.CANCEL} <b>Сайт в черном списке:</b> {url}",
+                    domain = re.search(r'https?://([^/]+)', url)
+                    if domain and domain.group(1) in Config.BLACKLISTED_DOMAINS:
+                        await message.answer(
+                            f"{Emojis.CANCEL} <b>Сайт в черном списке:</b> {url}",
+                            parse_mode=ParseMode.HTML
+                        )
+                        continue
+                    numbered_urls.append((i, url))
+
+                # Сайты обрабатываются группами в параллельных вкладках одного браузера;
+                # отчет по сайту отправляется, как только с него извлечены данные
+                results: Dict[int, Dict] = {}
+                found_phones: Dict[int, List[str]] = {}
+                previews: Dict[int, Message] = {}
+                try:
+                    async for event in parser.aiter_contacts_many(
+                            [url for _, url in numbered_urls], budget, Config.URL_TIMEOUT):
+                        i, url = numbered_urls[event.index]
+
+                        if isinstance(event, PhonesFound):
+                            found_phones[event.index] = event.phones
+                            continue
+
+                        # Пока запрашивается выручка, показываем уже найденные телефоны и ИНН
+                        if isinstance(event, InnsFound) and event.inns:
+                            preview = {
+                                'url': url,
+                                'phones': found_phones.get(event.index, []),
+                                'inns': event.inns,
+                                'revenues': {}
+                            }
+                            previews[event.index] = await message.answer(
+                                await ParserTools.format_site_report(i, preview) +
+                                f"\n\n{Emojis.TIME} <i>Получаю финансовые данные...</i>",
                                 parse_mode=ParseMode.HTML
                             )
                             continue
 
-                        contacts = parser.extract_contacts(url)
-                        all_results.append(contacts)
+                        if not isinstance(event, SiteDone):
+                            continue
+
+                        contacts = event.result
+                        results[event.index] = contacts
+                        # Прерванная проверка не должна заменить в архиве последнюю полную
+                        if not contacts['timed_out']:
+                            try:
+                                await asyncio.to_thread(
+                                    self.results_store.save_results, [contacts], message.chat.id)
+                            except Exception as e:
+                                print(f"Не удалось сохранить результаты: {str(e)}")
 
                         if contacts['skipped']:
                             await message.answer(
@@ -209,35 +471,51 @@ class CompetitorAnalyzerBot:
                             )
                             continue
 
-                        site_report = [
-                            f"\n{Emojis.CHECK} <b>Сайт #{i}:</b> <code>{url}</code>",
-                            f"\n{Emojis.PHONE} <b>Телефоны:</b>\n" + "\n".join(f"➖ {p}" for p in contacts['phones']) if
-                            contacts['phones'] else f"\n{Emojis.WARNING} Телефоны не найдены",
-                            f"\n{Emojis.INN} <b>ИНН:</b>\n" + "\n".join(f"➖ {inn}" for inn in contacts['inns']) if
-                            contacts['inns'] else f"\n{Emojis.WARNING} ИНН не найдены",
-                            f"\n{Emojis.MONEY} <b>Финансовые данные:</b>\n" +
-                            await ParserTools.format_revenue(contacts['revenues']) if
-                            contacts['revenues'] else ""
-                        ]
-
-                        await message.answer("\n".join(site_report), parse_mode=ParseMode.HTML)
+                        # После отмены не отправляем пустые отчеты по необработанным сайтам
+                        if budget.cancelled and not contacts['phones'] and not contacts['inns']:
+                            continue
+
+                        report = await ParserTools.format_site_report(i, contacts)
+                        if event.index in previews:
+                            try:
+                                await previews[event.index].edit_text(report, parse_mode=ParseMode.HTML)
+                                continue
+                            except Exception as e:
+                                print(f"Не удалось обновить отчет по {url}: {str(e)}")
+
+                        await message.answer(report, parse_mode=ParseMode.HTML)
                         await asyncio.sleep(1)
+                except Exception as e:
+                    await message.answer(
+                        f"{Emojis.ERROR} <b>Ошибка при обработке сайтов</b>\n"
+                        f"<i>Подробности:</i> {str(e)}",
+                        parse_mode=ParseMode.HTML
+                    )
 
-                    except Exception as e:
-                        await message.answer(
-                            f"{Emojis.ERROR} <b>Ошибка при обработке:</b> {url}\n"
-                            f"<i>Подробности:</i> {str(e)}",
-                            parse_mode=ParseMode.HTML
-                        )
-                        continue
+                all_results = [results[index] for index in sorted(results)]
+                processed = len(urls) - len(numbered_urls) + sum(
+                    1 for contacts in all_results if not contacts.get('timed_out'))
+                if budget.cancelled:
+                    caption = (f"{Emojis.CANCEL} <b>Обработка отменена.</b>\n"
+                               f"Частичный отчет: {processed} из {len(urls)} сайтов")
+                elif processed < len(urls):
+                    caption = (f"{Emojis.WAIT} <b>Превышено время обработки.</b>\n"
+                               f"Частичный отчет: {processed} из {len(urls)} сайтов")
+                else:
+                    caption = f"{Emojis.DOC} <b>Полный отчет готов!</b> {Emojis.TADA}"
 
                 if all_results:
                     excel_file = await ParserTools.create_excel_report(all_results)
                     await message.answer_document(
                         excel_file,
-                        caption=f"{Emojis.DOC} <b>Полный отчет готов!</b> {Emojis.TADA}",
+                        caption=caption,
                         parse_mode=ParseMode.HTML
                     )
+                elif budget.cancelled:
+                    await message.answer(caption, parse_mode=ParseMode.HTML)
+            finally:
+                # Закрытие браузера может ждать отмену в другом потоке, поэтому не в цикле событий
+                await SiteParser.run_in_browser_thread(parser.close)
 
         except Exception as e:
             await message.answer(
@@ -254,6 +532,118 @@ class CompetitorAnalyzerBot:
             except:
                 pass
 
+    async def _process_inns(self, message: Message, inns: List[str], budget: TimeBudget):
+        """Пакетное получение финансовых данных по списку ИНН"""
+        processing_msg = await message.answer(
+            f"{Emojis.TIME} <b>Обрабатываю {len(inns)} ИНН...</b>",
+            parse_mode=ParseMode.HTML
+        )
+        last_update = 0.0
+
+        async def report_progress(progress: EnrichmentProgress):
+            nonlocal last_update
+            now = time.monotonic()
+            if progress.done < progress.total and now - last_update < Config.PROGRESS_UPDATE_INTERVAL:
+                return
+            last_update = now
+            try:
+                await self.bot.edit_message_text(
+                    f"{Emojis.TIME} <b>Обработано {progress.done} из {progress.total} ИНН</b>\n"
+                    f"{Emojis.MONEY} Найдены данные: {progress.found}\n"
+                    f"{Emojis.QUEUE} Из кэша: {progress.cached}",
+                    chat_id=message.chat.id,
+                    message_id=processing_msg.message_id,
+                    parse_mode=ParseMode.HTML
+                )
+            except Exception:
+                pass
+
+        try:
+            revenues = await self.enricher.enrich(inns, on_progress=report_progress, budget=budget)
+            found = sum(1 for revenue in revenues.values() if revenue)
+
+            try:
+                await asyncio.to_thread(self.results_store.save_revenues, revenues)
+            except Exception as e:
+                print(f"Не удалось сохранить результаты: {str(e)}")
+
+            if budget.cancelled:
+                title = f"{Emojis.CANCEL} <b>Обработка отменена.</b> Частичный отчет"
+            elif len(revenues) < len(inns) and budget.expired:
+                title = f"{Emojis.WAIT} <b>Превышено время обработки.</b> Частичный отчет"
+            elif len(revenues) < len(inns):
+                # Время задачи не вышло, но часть ИНН не ответила и со второй попытки
+                title = (f"{Emojis.WAIT} <b>Часть ИНН не обработана:</b> "
+                         f"datanewton.ru не ответил вовремя. Частичный отчет")
+            else:
+                title = f"{Emojis.DOC} <b>Обогащение готово!</b> {Emojis.TADA}"
+
+            excel_file = await ParserTools.create_inn_report(inns, revenues)
+            await message.answer_document(
+                excel_file,
+                caption=f"{title}\n"
+                        f"Обработано {len(revenues)} из {len(inns)} ИНН, найдены данные для {found}",
+                parse_mode=ParseMode.HTML
+            )
+
+        except Exception as e:
+            await message.answer(
+                f"{Emojis.ERROR} <b>Критическая ошибка:</b>\n"
+                f"<code>{str(e)}</code>",
+                parse_mode=ParseMode.HTML
+            )
+        finally:
+            try:
+                await self.bot.delete_message(
+                    chat_id=message.chat.id,
+                    message_id=processing_msg.message_id
+                )
+            except:
+                pass
+
+    def _start_job(self, user_id: int) -> TimeBudget:
+        """Регистрация запроса пользователя для возможной отмены"""
+        job = TimeBudget()
+        self.active_jobs[user_id].add(job)
+        return job
+
+    def _finish_job(self, user_id: int, job: TimeBudget):
+        self.active_jobs[user_id].discard(job)
+        if not self.active_jobs[user_id]:
+            del self.active_jobs[user_id]
+
+    @staticmethod
+    async def _acquire_unless_cancelled(semaphore: asyncio.Semaphore, job: TimeBudget) -> bool:
+        """Ожидание места в очереди; False, если запрос отменили раньше, чем он начался.
+
+        Отмена приходит из другого потока, поэтому ожидание семафора прерывается
+        через событие цикла, и отмененный запрос сразу освобождает лимит пользователя.
+        """
+        loop = asyncio.get_running_loop()
+        cancelled = asyncio.Event()
+
+        def notify():
+            loop.call_soon_threadsafe(cancelled.set)
+
+        job.on_cancel(notify)
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        waiter = asyncio.ensure_future(cancelled.wait())
+        try:
+            await asyncio.wait({acquire, waiter}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            job.remove_on_cancel(notify)
+            waiter.cancel()
+            if not acquire.done():
+                acquire.cancel()
+                await asyncio.wait({acquire})
+
+        if acquire.cancelled():
+            return False
+        if job.cancelled:
+            semaphore.release()
+            return False
+        return True
+
     async def _start_handler(self, message: Message):
         """Обработчик команды /start"""
         if not await UserManager.is_allowed(message.from_user.id):
@@ -277,6 +667,7 @@ class CompetitorAnalyzerBot:
 • Анализ финансовых показателей {Emojis.CHART}
 
 {Emojis.SUCCESS} <b>Просто пришли мне ссылки на сайты</b> (до {Config.MAX_URLS_PER_REQUEST} за раз)
+{Emojis.DOC} Или файл xlsx/csv со списком ИНН (до {Config.MAX_INNS_PER_FILE} за раз)
 
 {Emojis.INFO} Для справки используйте /help
 """
@@ -290,6 +681,12 @@ class CompetitorAnalyzerBot:
 <b>Основные команды:</b>
 /start - Начать работу с ботом
 /help - Показать эту справку
+/cancel - Остановить текущие запросы
+/watch [ссылки] - Отслеживать изменения на сайтах
+/unwatch [ссылки] - Перестать отслеживать сайты
+/watchlist - Список отслеживаемых сайтов
+/search [ИНН, телефон или домен] - Поиск по общему архиву результатов всех пользователей
+/export - Выгрузка общего архива результатов в Excel
 
 <b>Для администраторов:</b>
 /add_user [id] - Добавить пользователя
@@ -300,9 +697,32 @@ class CompetitorAnalyzerBot:
 1. Пришлите ссылки на сайты конкурентов
 2. Получите контактные данные и финансовую информацию
 3. Скачайте полный отчет в Excel
+
+<b>Пакетная обработка ИНН:</b>
+Пришлите файл xlsx или csv со списком ИНН — бот проверит их,
+уберет дубли и вернет таблицу с финансовыми данными
 """
         await message.answer(help_text, parse_mode=ParseMode.HTML)
 
+    async def _cancel_handler(self, message: Message):
+        """Отмена всех активных запросов пользователя"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        jobs = [job for job in self.active_jobs.get(message.from_user.id, ()) if not job.cancelled]
+        if not jobs:
+            await message.answer(f"{Emojis.INFO} Нет активных запросов")
+            return
+
+        await message.answer(
+            f"{Emojis.CANCEL} <b>Останавливаю запросов: {len(jobs)}</b>\n"
+            "<i>Отчет по уже обработанным данным придет отдельно</i>",
+            parse_mode=ParseMode.HTML
+        )
+        for job in jobs:
+            # Закрытие браузеров блокирует, поэтому выполняется вне цикла событий
+            await asyncio.to_thread(job.cancel)
+
     async def _add_user_handler(self, message: Message):
         """Добавление пользователя в разрешенные"""
         if not await UserManager.is_admin(message.from_user.id):
@@ -414,18 +834,206 @@ class CompetitorAnalyzerBot:
             urls = urls[:Config.MAX_URLS_PER_REQUEST]
 
         self.active_requests[user_id] += 1
+        job = self._start_job(user_id)
 
         try:
-            async with self.request_semaphore:
-                await self._process_urls(message, urls)
+            # Отмененный в очереди запрос не ждет своей очереди и не занимает браузер
+            if await self._acquire_unless_cancelled(self.request_semaphore, job):
+                try:
+                    await self._process_urls(message, urls, job.child(Config.REQUEST_TIMEOUT))
+                finally:
+                    self.request_semaphore.release()
         finally:
+            self._finish_job(user_id, job)
             self.active_requests[user_id] = max(0, self.active_requests[user_id] - 1)
             if self.active_requests[user_id] == 0:
                 del self.active_requests[user_id]
 
+    async def _document_handler(self, message: Message):
+        """Обработчик файлов со списком ИНН"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        user_id = message.from_user.id
+
+        if user_id not in self.user_sessions:
+            await message.answer(f"{Emojis.WARNING} Пожалуйста, начните с команды /start")
+            return
+
+        if self.active_requests[user_id] >= Config.MAX_CONCURRENT_REQUESTS:
+            await message.answer(
+                f"{Emojis.WAIT} <b>Достигнут лимит запросов!</b>\n\n"
+                f"У меня сейчас {Config.MAX_CONCURRENT_REQUESTS} активных запроса. "
+                "Пожалуйста, дождитесь их завершения.",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        document = message.document
+        if not InnTools.is_supported_file(document.file_name):
+            await message.answer(f"{Emojis.ERROR} Поддерживаются только файлы xlsx и csv!")
+            return
+
+        if document.file_size and document.file_size > Config.MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+            await message.answer(
+                f"{Emojis.ERROR} Файл слишком большой (максимум {Config.MAX_UPLOAD_SIZE_MB} МБ)")
+            return
+
+        try:
+            content = await self.bot.download(document)
+            inns, invalid = await asyncio.to_thread(InnTools.read_inns, content.read(), document.file_name)
+        except Exception as e:
+            await message.answer(
+                f"{Emojis.ERROR} <b>Не удалось прочитать файл:</b>\n"
+                f"<code>{str(e)}</code>",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        if not inns:
+            await message.answer(f"{Emojis.ERROR} Не найдено корректных ИНН в файле!")
+            return
+
+        if invalid:
+            await message.answer(f"{Emojis.WARNING} Пропущено некорректных значений: {invalid}")
+
+        if len(inns) > Config.MAX_INNS_PER_FILE:
+            await message.answer(
+                f"{Emojis.WARNING} Принято первых {Config.MAX_INNS_PER_FILE} из {len(inns)} ИНН")
+            inns = inns[:Config.MAX_INNS_PER_FILE]
+
+        self.active_requests[user_id] += 1
+        job = self._start_job(user_id)
+
+        try:
+            if await self._acquire_unless_cancelled(self.bulk_semaphore, job):
+                try:
+                    await self._process_inns(message, inns, job.child(Config.BULK_REQUEST_TIMEOUT))
+                finally:
+                    self.bulk_semaphore.release()
+        finally:
+            self._finish_job(user_id, job)
+            self.active_requests[user_id] = max(0, self.active_requests[user_id] - 1)
+            if self.active_requests[user_id] == 0:
+                del self.active_requests[user_id]
+
+    async def _notify_watch_diff(self, chat_id: int, diff: WatchDiff):
+        """Отправка изменений по отслеживаемому сайту"""
+        await self._send_message(chat_id, await ParserTools.format_watch_diff(diff))
+
+    async def _watch_handler(self, message: Message):
+        """Подписка на изменения сайтов"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        urls = ParserTools.extract_urls(message.text or "")
+        if not urls:
+            await message.answer(
+                f"{Emojis.ERROR} <b>Использование:</b> /watch [ссылки на сайты]",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        added = []
+        store = self.watch_scheduler.store
+        for url in urls:
+            if await asyncio.to_thread(store.count, message.chat.id) >= Config.MAX_WATCHES_PER_USER:
+                await message.answer(
+                    f"{Emojis.WARNING} Достигнут лимит в {Config.MAX_WATCHES_PER_USER} отслеживаемых сайтов")
+                break
+            if await asyncio.to_thread(self.watch_scheduler.subscribe, message.chat.id, url):
+                added.append(url)
+
+        if added:
+            await message.answer(
+                f"{Emojis.EYE} <b>Добавлено в отслеживание:</b>\n" +
+                "\n".join(f"➖ <code>{url}</code>" for url in added) +
+                "\n\n<i>Я пришлю сообщение, когда на сайтах изменятся телефоны, ИНН или выручка</i>",
+                parse_mode=ParseMode.HTML
+            )
+        else:
+            await message.answer(f"{Emojis.WARNING} Эти сайты уже отслеживаются")
+
+    async def _unwatch_handler(self, message: Message):
+        """Отписка от изменений сайтов"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        urls = ParserTools.extract_urls(message.text or "")
+        if not urls:
+            await message.answer(
+                f"{Emojis.ERROR} <b>Использование:</b> /unwatch [ссылки на сайты]",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        removed = [url for url in urls
+                   if await asyncio.to_thread(self.watch_scheduler.store.remove, message.chat.id, url)]
+        if removed:
+            await message.answer(
+                f"{Emojis.SUCCESS} <b>Удалено из отслеживания:</b>\n" +
+                "\n".join(f"➖ <code>{url}</code>" for url in removed),
+                parse_mode=ParseMode.HTML
+            )
+        else:
+            await message.answer(f"{Emojis.WARNING} Эти сайты не отслеживаются")
+
+    async def _watchlist_handler(self, message: Message):
+        """Список отслеживаемых сайтов"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        urls = await asyncio.to_thread(self.watch_scheduler.store.list_urls, message.chat.id)
+        if not urls:
+            await message.answer(f"{Emojis.INFO} Список отслеживаемых сайтов пуст")
+            return
+
+        await message.answer(
+            f"{Emojis.LIST} <b>Отслеживаемые сайты:</b>\n\n" +
+            "\n".join(f"• <code>{url}</code>" for url in urls),
+            parse_mode=ParseMode.HTML
+        )
+
+    async def _search_handler(self, message: Message):
+        """Поиск по общему архиву результатов всех пользователей без обхода сайтов"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        parts = (message.text or "").split(maxsplit=1)
+        if len(parts) < 2:
+            await message.answer(
+                f"{Emojis.ERROR} <b>Использование:</b> /search [ИНН, телефон или домен]",
+                parse_mode=ParseMode.HTML
+            )
+            return
+
+        found = await asyncio.to_thread(self.results_store.search, parts[1])
+        await message.answer(await ParserTools.format_search_results(found), parse_mode=ParseMode.HTML)
+
+    async def _export_handler(self, message: Message):
+        """Выгрузка общего архива результатов всех пользователей"""
+        if not await UserManager.is_allowed(message.from_user.id):
+            return
+
+        rows = await asyncio.to_thread(self.results_store.export_rows)
+        if not rows:
+            await message.answer(f"{Emojis.INFO} Сохраненных результатов пока нет")
+            return
+
+        excel_file = await ParserTools.create_store_export(rows)
+        await message.answer_document(
+            excel_file,
+            caption=f"{Emojis.DOC} <b>Архив результатов</b>",
+            parse_mode=ParseMode.HTML
+        )
+
     async def run(self):
         """Запуск бота"""
-        await self.dp.start_polling(self.bot)
+        scheduler_task = asyncio.create_task(self.watch_scheduler.run())
+        try:
+            await self.dp.start_polling(self.bot)
+        finally:
+            scheduler_task.cancel()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+import argparse
+import bisect
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class PhoneInfo:
+    """Сведения о номере из плана нумерации"""
+    phone: str
+    region: Optional[str]
+    operator: Optional[str]
+    kind: str
+
+    @property
+    def kind_title(self) -> str:
+        return 'Мобильный' if self.kind == NumberingPlan.MOBILE else 'Городской'
+
+
+class NumberingPlan:
+    """Индекс диапазонов нумерации ABC/DEF из реестра Россвязи.
+
+    Индекс хранится в компактном бинарном файле: отсортированные массивы
+    начал и концов диапазонов (uint64), индексы оператора и региона (uint16),
+    тип номера (uint8) и таблица строк в JSON. Файл отображается в память,
+    поиск номера — bisect по массиву начал, O(log n) без загрузки в кучу.
+    """
+    MAGIC = b'RUNP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHxxII')
+
+    LANDLINE = 'landline'
+    MOBILE = 'mobile'
+    KINDS = (LANDLINE, MOBILE)
+
+    # Коды, выделенные России в зоне +7 (7xx — Казахстан)
+    RUSSIAN_PREFIXES = ('3', '4', '8', '9')
+
+    DEFAULT_PATH = os.getenv(
+        'PHONE_NUMBERING_INDEX',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'numbering.bin')
+    )
+
+    _default: Optional['NumberingPlan'] = None
+
+    def __init__(self, path: Optional[str] = None):
+        self._mmap = None
+        self.count = 0
+        self.strings: List[str] = []
+        self.starts = self.ends = self.operators = self.regions = self.kinds = ()
+
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path: str):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, strings_len = self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError(f"Неизвестный формат индекса нумерации: {path}")
+
+        view = memoryview(self._mmap)
+        offset = self.HEADER.size
+        self.starts = view[offset:offset + 8 * count].cast('Q')
+        offset += 8 * count
+        self.ends = view[offset:offset + 8 * count].cast('Q')
+        offset += 8 * count
+        self.operators = view[offset:offset + 2 * count].cast('H')
+        offset += 2 * count
+        self.regions = view[offset:offset + 2 * count].cast('H')
+        offset += 2 * count
+        self.kinds = view[offset:offset + count]
+        offset += count
+        self.strings = json.loads(bytes(view[offset:offset + strings_len]).decode('utf-8'))
+        self.count = count
+
+    @classmethod
+    def default(cls) -> 'NumberingPlan':
+        """Общий на процесс индекс, загружается один раз"""
+        if cls._default is None:
+            try:
+                cls._default = cls(cls.DEFAULT_PATH)
+            except Exception as e:
+                print(f"Не удалось загрузить индекс нумерации: {str(e)}")
+                cls._default = cls()
+        return cls._default
+
+    @property
+    def loaded(self) -> bool:
+        return self.count > 0
+
+    @staticmethod
+    def national_number(phone: str) -> Optional[int]:
+        """Десятизначный номер без кода страны"""
+        digits = re.sub(r'\D', '', phone)
+        if len(digits) == 11 and digits[0] in '78':
+            digits = digits[1:]
+        if len(digits) != 10:
+            return None
+        return int(digits)
+
+    def lookup(self, phone: str) -> Optional[PhoneInfo]:
+        """Поиск номера в плане нумерации; None, если номер не выделен"""
+        number = self.national_number(phone)
+        if number is None:
+            return None
+
+        formatted = f"+7{number:010d}"
+        if not self.loaded:
+            if formatted[2] not in self.RUSSIAN_PREFIXES:
+                return None
+            kind = self.MOBILE if formatted[2] == '9' else self.LANDLINE
+            return PhoneInfo(formatted, None, None, kind)
+
+        i = bisect.bisect_right(self.starts, number) - 1
+        if i < 0 or number > self.ends[i]:
+            return None
+
+        return PhoneInfo(
+            phone=formatted,
+            region=self.strings[self.regions[i]] or None,
+            operator=self.strings[self.operators[i]] or None,
+            kind=self.KINDS[self.kinds[i]]
+        )
+
+    def is_valid(self, phone: str) -> bool:
+        return self.lookup(phone) is not None
+
+    @staticmethod
+    def _read_registry(path: str) -> List[List[str]]:
+        for encoding in ('utf-8-sig', 'cp1251'):
+            try:
+                with open(path, encoding=encoding, newline='') as f:
+                    return list(csv.reader(f, delimiter=';'))
+            except UnicodeDecodeError:
+                continue
+        raise ValueError(f"Не удалось определить кодировку файла {path}")
+
+    @classmethod
+    def build(cls, registry_files: List[str], output: str) -> int:
+        """Сборка индекса из CSV реестра Россвязи (ABC-3xx, ABC-4xx, ABC-8xx, DEF-9xx).
+
+        Колонки: код; от; до; емкость; оператор; регион; ...
+        Возвращает количество диапазонов в индексе.
+        """
+        strings: List[str] = ['']
+        string_ids = {'': 0}
+
+        def string_id(value: str) -> int:
+            value = value.strip()
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            return string_ids[value]
+
+        ranges: List[Tuple[int, int, int, int, int]] = []
+        for path in registry_files:
+            for row in cls._read_registry(path):
+                if len(row) < 6 or not row[0].strip().isdigit():
+                    continue
+                code = row[0].strip().zfill(3)
+                start = int(code + row[1].strip().zfill(7))
+                end = int(code + row[2].strip().zfill(7))
+                kind = cls.KINDS.index(cls.MOBILE if code.startswith('9') else cls.LANDLINE)
+                ranges.append((start, end, string_id(row[4]), string_id(row[5]), kind))
+
+        if len(strings) > 0xFFFF:
+            raise ValueError("Слишком много уникальных операторов и регионов для индекса")
+
+        ranges.sort()
+        strings_blob = json.dumps(strings, ensure_ascii=False).encode('utf-8')
+        count = len(ranges)
+
+        with open(output, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, count, len(strings_blob)))
+            f.write(struct.pack(f'<{count}Q', *(r[0] for r in ranges)))
+            f.write(struct.pack(f'<{count}Q', *(r[1] for r in ranges)))
+            f.write(struct.pack(f'<{count}H', *(r[2] for r in ranges)))
+            f.write(struct.pack(f'<{count}H', *(r[3] for r in ranges)))
+            f.write(struct.pack(f'<{count}B', *(r[4] for r in ranges)))
+            f.write(strings_blob)
+
+        return count
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Сборка индекса плана нумерации из реестра Россвязи")
+    arg_parser.add_argument('registry', nargs='+', help="CSV файлы ABC-3xx, ABC-4xx, ABC-8xx, DEF-9xx")
+    arg_parser.add_argument('-o', '--output', default=NumberingPlan.DEFAULT_PATH)
+    args = arg_parser.parse_args()
+
+    ranges_count = NumberingPlan.build(args.registry, args.output)
+    print(f"Индекс сохранен в {args.output}: {ranges_count} диапазонов")
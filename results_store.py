@@ -0,0 +1,211 @@
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Optional
+from urllib.parse import urlparse
+
+from inn_enrichment import InnTools
+from yandex_parser import SiteParser
+
+
+class ResultsStore:
+    """Хранилище результатов анализа в SQLite.
+
+    Каждый обход сайта сохраняется отдельной записью, поэтому история
+    изменений телефонов и ИНН не теряется. Индексы по нормализованному
+    телефону, ИНН и домену позволяют отвечать на поиск без обхода сайтов.
+    Архив общий для всех пользователей бота: chat_id только отмечает, кто
+    запустил проверку (для проверок по подпискам он пустой), а поиск и
+    выгрузка возвращают данные всех чатов.
+    """
+
+    def __init__(self, path: str = "results.db"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS site_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER,
+                    url TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    skipped INTEGER NOT NULL DEFAULT 0,
+                    source TEXT NOT NULL,
+                    checked_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_site_results_domain ON site_results (domain, checked_at);
+
+                CREATE TABLE IF NOT EXISTS site_phones (
+                    result_id INTEGER NOT NULL REFERENCES site_results (id),
+                    phone TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_site_phones_phone ON site_phones (phone);
+                CREATE INDEX IF NOT EXISTS idx_site_phones_result ON site_phones (result_id);
+
+                CREATE TABLE IF NOT EXISTS site_inns (
+                    result_id INTEGER NOT NULL REFERENCES site_results (id),
+                    inn TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_site_inns_inn ON site_inns (inn);
+                CREATE INDEX IF NOT EXISTS idx_site_inns_result ON site_inns (result_id);
+
+                CREATE TABLE IF NOT EXISTS revenues (
+                    inn TEXT NOT NULL,
+                    revenue TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    checked_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_revenues_inn ON revenues (inn, checked_at);
+            """)
+
+    @staticmethod
+    def normalize_domain(value: str) -> str:
+        """Домен без схемы, порта и префикса www"""
+        value = value.strip().lower()
+        if '//' not in value:
+            value = f"//{value}"
+        domain = urlparse(value).hostname or ''
+        return domain[4:] if domain.startswith('www.') else domain
+
+    def _save_revenues(self, revenues: Dict[str, Optional[str]], source: str, now: float):
+        self._conn.executemany(
+            "INSERT INTO revenues (inn, revenue, source, checked_at) VALUES (?, ?, ?, ?)",
+            [(inn, revenue, source, now) for inn, revenue in revenues.items()
+             if revenue and revenue != "Финансовые данные не найдены"]
+        )
+
+    def save_results(self, results: List[Dict], chat_id: Optional[int] = None, source: str = "urls"):
+        """Сохранение результатов extract_contacts"""
+        now = time.time()
+        with self._lock, self._conn:
+            for result in results:
+                cursor = self._conn.execute(
+                    "INSERT INTO site_results (chat_id, url, domain, skipped, source, checked_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (chat_id, result['url'], self.normalize_domain(result['url']),
+                     int(result['skipped']), source, now)
+                )
+                result_id = cursor.lastrowid
+                self._conn.executemany(
+                    "INSERT INTO site_phones (result_id, phone) VALUES (?, ?)",
+                    [(result_id, phone) for phone in result['phones']]
+                )
+                self._conn.executemany(
+                    "INSERT INTO site_inns (result_id, inn) VALUES (?, ?)",
+                    [(result_id, inn) for inn in result['inns']]
+                )
+                self._save_revenues(result['revenues'], source, now)
+
+    def save_revenues(self, revenues: Dict[str, Optional[str]], source: str = "inns"):
+        """Сохранение финансовых данных, полученных без обхода сайтов"""
+        with self._lock, self._conn:
+            self._save_revenues(revenues, source, time.time())
+
+    def _latest_revenue(self, inn: str) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT revenue FROM revenues WHERE inn = ? ORDER BY checked_at DESC LIMIT 1", (inn,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _sites_by(self, table: str, column: str, value: str) -> List[Dict]:
+        rows = self._conn.execute(
+            f"SELECT r.domain, r.url, MIN(r.checked_at), MAX(r.checked_at) "
+            f"FROM {table} t JOIN site_results r ON r.id = t.result_id "
+            f"WHERE t.{column} = ? GROUP BY r.domain ORDER BY MAX(r.checked_at) DESC",
+            (value,)
+        ).fetchall()
+        return [
+            {'domain': domain, 'url': url, 'first_seen': first_seen, 'last_seen': last_seen}
+            for domain, url, first_seen, last_seen in rows
+        ]
+
+    def search_phone(self, phone: str) -> Dict:
+        """Сайты, на которых встречался телефон"""
+        with self._lock:
+            return {'type': 'phone', 'query': phone, 'sites': self._sites_by('site_phones', 'phone', phone)}
+
+    def search_inn(self, inn: str) -> Dict:
+        """Сайты, на которых встречался ИНН, и последние финансовые данные"""
+        with self._lock:
+            return {
+                'type': 'inn',
+                'query': inn,
+                'sites': self._sites_by('site_inns', 'inn', inn),
+                'revenue': self._latest_revenue(inn)
+            }
+
+    def search_domain(self, domain: str) -> Dict:
+        """Последний результат по домену и история его проверок"""
+        domain = self.normalize_domain(domain)
+        with self._lock:
+            checks = self._conn.execute(
+                "SELECT id, url, checked_at FROM site_results "
+                "WHERE domain = ? AND skipped = 0 ORDER BY checked_at DESC",
+                (domain,)
+            ).fetchall()
+            if not checks:
+                return {'type': 'domain', 'query': domain, 'checks': 0}
+
+            result_id, url, checked_at = checks[0]
+            phones = [row[0] for row in self._conn.execute(
+                "SELECT phone FROM site_phones WHERE result_id = ? ORDER BY phone", (result_id,))]
+            inns = [row[0] for row in self._conn.execute(
+                "SELECT inn FROM site_inns WHERE result_id = ? ORDER BY inn", (result_id,))]
+
+            return {
+                'type': 'domain',
+                'query': domain,
+                'url': url,
+                'checks': len(checks),
+                'first_seen': checks[-1][2],
+                'last_seen': checked_at,
+                'phones': phones,
+                'inns': inns,
+                'revenues': {inn: self._latest_revenue(inn) for inn in inns}
+            }
+
+    def search(self, query: str) -> Dict:
+        """Поиск по ИНН, телефону или домену в зависимости от вида запроса"""
+        query = query.strip()
+        digits = ''.join(ch for ch in query if ch.isdigit())
+
+        # Десятизначный номер телефона без кода страны тоже похож на ИНН
+        if InnTools.is_valid_inn(query):
+            return self.search_inn(query)
+
+        if digits and len(digits) >= 10 and not any(ch.isalpha() for ch in query):
+            phone = SiteParser.normalize_phone(query)
+            if phone.startswith('+7') and len(phone) == 12:
+                return self.search_phone(phone)
+
+        return self.search_domain(query)
+
+    def export_rows(self) -> List[Dict]:
+        """Последний результат по каждому URL в виде строк отчета"""
+        with self._lock:
+            latest = self._conn.execute(
+                "SELECT r.id, r.url, r.checked_at FROM site_results r "
+                "JOIN (SELECT url, MAX(checked_at) AS checked_at FROM site_results "
+                "      WHERE skipped = 0 GROUP BY url) l "
+                "ON r.url = l.url AND r.checked_at = l.checked_at "
+                "ORDER BY r.domain"
+            ).fetchall()
+
+            rows = []
+            for result_id, url, checked_at in latest:
+                phones = [row[0] for row in self._conn.execute(
+                    "SELECT phone FROM site_phones WHERE result_id = ?", (result_id,))] or ['Не найден']
+                inns = [row[0] for row in self._conn.execute(
+                    "SELECT inn FROM site_inns WHERE result_id = ?", (result_id,))] or ['Не найден']
+                revenues = {inn: self._latest_revenue(inn) for inn in inns}
+                for phone in phones:
+                    for inn in inns:
+                        rows.append({
+                            'URL': url,
+                            'Телефон': phone,
+                            'ИНН': inn,
+                            'Выручка': revenues.get(inn) or 'Нет данных',
+                            'Дата проверки': time.strftime('%Y-%m-%d %H:%M', time.localtime(checked_at))
+                        })
+            return rows
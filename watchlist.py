@@ -0,0 +1,373 @@
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Callable, Awaitable
+
+from company_financials import CompanyFinancials
+from yandex_parser import SiteParser, TimeBudget
+
+
+@dataclass
+class Watch:
+    """Отслеживаемый сайт и последний известный снимок его данных"""
+    id: int
+    chat_id: int
+    url: str
+    content_hash: Optional[str]
+    phones: List[str]
+    inns: List[str]
+    # Выручка за последний год по ИНН (None — нет данных); в старых записях — текст отчета
+    revenues: Dict[str, Optional[float]]
+    revenue_checked: float
+    next_check: float
+
+
+@dataclass
+class SiteSnapshot:
+    """Свежие данные сайта, полученные при повторном обходе"""
+    content_hash: str
+    phones: List[str] = field(default_factory=list)
+    inns: List[str] = field(default_factory=list)
+    revenues: Dict[str, Optional[float]] = field(default_factory=dict)
+    revenue_checked: float = 0.0
+    # Тексты отчетов по ИНН, запрошенным при этой проверке
+    reports: Dict[str, str] = field(default_factory=dict)
+
+
+@dataclass
+class WatchDiff:
+    """Изменения на сайте с момента предыдущей проверки"""
+    url: str
+    added_phones: List[str] = field(default_factory=list)
+    removed_phones: List[str] = field(default_factory=list)
+    added_inns: List[str] = field(default_factory=list)
+    removed_inns: List[str] = field(default_factory=list)
+    revenue_changes: Dict[str, tuple] = field(default_factory=dict)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added_phones or self.removed_phones or self.added_inns or
+                    self.removed_inns or self.revenue_changes)
+
+    @staticmethod
+    def _is_amount(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+    @classmethod
+    def between(cls, watch: Watch, snapshot: SiteSnapshot) -> 'WatchDiff':
+        """Изменения между снимками; выручка сравнивается по числу, а не по тексту отчета"""
+        old_phones, new_phones = set(watch.phones), set(snapshot.phones)
+        old_inns, new_inns = set(watch.inns), set(snapshot.inns)
+        return cls(
+            url=watch.url,
+            added_phones=sorted(new_phones - old_phones),
+            removed_phones=sorted(old_phones - new_phones),
+            added_inns=sorted(new_inns - old_inns),
+            removed_inns=sorted(old_inns - new_inns),
+            revenue_changes={
+                inn: (watch.revenues[inn], revenue)
+                for inn, revenue in snapshot.revenues.items()
+                if cls._is_amount(watch.revenues.get(inn)) and cls._is_amount(revenue)
+                and watch.revenues[inn] != revenue
+            }
+        )
+
+
+class WatchlistStore:
+    """Хранилище подписок на сайты в SQLite"""
+
+    def __init__(self, path: str = "watchlist.db"):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS watches (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER NOT NULL,
+                    url TEXT NOT NULL,
+                    content_hash TEXT,
+                    phones TEXT NOT NULL DEFAULT '[]',
+                    inns TEXT NOT NULL DEFAULT '[]',
+                    revenues TEXT NOT NULL DEFAULT '{}',
+                    revenue_checked REAL NOT NULL DEFAULT 0,
+                    next_check REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (chat_id, url)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_watches_next_check ON watches (next_check)")
+
+    @staticmethod
+    def _row_to_watch(row) -> Watch:
+        return Watch(
+            id=row[0], chat_id=row[1], url=row[2], content_hash=row[3],
+            phones=json.loads(row[4]), inns=json.loads(row[5]), revenues=json.loads(row[6]),
+            revenue_checked=row[7], next_check=row[8]
+        )
+
+    def add(self, chat_id: int, url: str, next_check: float) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO watches (chat_id, url, next_check, created_at) VALUES (?, ?, ?, ?)",
+                (chat_id, url, next_check, time.time())
+            )
+            return cursor.rowcount > 0
+
+    def remove(self, chat_id: int, url: str) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM watches WHERE chat_id = ? AND url = ?", (chat_id, url))
+            return cursor.rowcount > 0
+
+    def count(self, chat_id: int) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM watches WHERE chat_id = ?", (chat_id,)).fetchone()[0]
+
+    def list_urls(self, chat_id: int) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM watches WHERE chat_id = ? ORDER BY created_at", (chat_id,))
+            return [row[0] for row in rows]
+
+    def due_urls(self, now: float, limit: int) -> List[str]:
+        """URL, по которым наступил срок проверки хотя бы одной подписки"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM watches WHERE next_check <= ? GROUP BY url ORDER BY MIN(next_check) LIMIT ?",
+                (now, limit)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def for_url(self, url: str) -> List[Watch]:
+        """Все подписки на URL, включая те, срок которых еще не наступил"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, chat_id, url, content_hash, phones, inns, revenues, revenue_checked, next_check "
+                "FROM watches WHERE url = ?",
+                (url,)
+            ).fetchall()
+        return [self._row_to_watch(row) for row in rows]
+
+    def next_check_for(self, url: str) -> Optional[float]:
+        with self._lock:
+            return self._conn.execute("SELECT MIN(next_check) FROM watches WHERE url = ?", (url,)).fetchone()[0]
+
+    def reschedule(self, watch_id: int, next_check: float):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE watches SET next_check = ? WHERE id = ?", (next_check, watch_id))
+
+    def save_snapshot(self, watch_id: int, snapshot: SiteSnapshot, next_check: float):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE watches SET content_hash = ?, phones = ?, inns = ?, revenues = ?, "
+                "revenue_checked = ?, next_check = ? WHERE id = ?",
+                (snapshot.content_hash, json.dumps(snapshot.phones), json.dumps(snapshot.inns),
+                 json.dumps(snapshot.revenues, ensure_ascii=False), snapshot.revenue_checked,
+                 next_check, watch_id)
+            )
+
+
+class WatchlistScheduler:
+    """Фоновый повторный обход отслеживаемых сайтов.
+
+    Проверки распределяются во времени случайным сдвигом. Если хэш
+    содержимого страницы не изменился, извлечение контактов пропускается,
+    а выручка обновляется только раз в revenue_refresh секунд. Расписание
+    общее для всех подписок на URL: когда наступает срок одной из них,
+    страница загружается один раз и проверяются все подписки сразу.
+    """
+
+    def __init__(self, store: WatchlistStore,
+                 notify: Callable[[int, WatchDiff], Awaitable[None]],
+                 interval: int = 7 * 24 * 3600,
+                 retry_interval: int = 3600,
+                 revenue_refresh: int = 30 * 24 * 3600,
+                 tick: int = 60,
+                 batch_size: int = 5,
+                 revenue_cache=None,
+                 max_tabs: int = 1,
+                 results_store=None,
+                 url_timeout: Optional[float] = None):
+        self.store = store
+        self.notify = notify
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.revenue_refresh = revenue_refresh
+        self.tick = tick
+        self.batch_size = batch_size
+        self.revenue_cache = revenue_cache
+        self.max_tabs = max_tabs
+        self.results_store = results_store
+        self.url_timeout = url_timeout
+
+    def _next_check(self, now: float, failed: bool = False) -> float:
+        """Срок следующей проверки; после ошибки — через retry_interval, а не через полный интервал"""
+        interval = self.retry_interval if failed else self.interval
+        return now + interval * random.uniform(0.9, 1.1)
+
+    def subscribe(self, chat_id: int, url: str) -> bool:
+        """Подписка на сайт; первая проверка случайно сдвигается в пределах часа.
+
+        Если на URL уже есть подписки, новая проверяется вместе с ними.
+        """
+        next_check = self.store.next_check_for(url)
+        if next_check is None:
+            next_check = time.time() + random.uniform(0, 3600)
+        return self.store.add(chat_id, url, next_check)
+
+    def _lookup_revenues(self, parser: SiteParser, inns: List[str]) -> Dict[str, CompanyFinancials]:
+        """Финансовые данные по ИНН; ИНН с неудачным запросом в результат не попадают"""
+        revenues = {}
+        missing = []
+        for inn in inns:
+            cached = self.revenue_cache.get(inn) if self.revenue_cache else None
+            if cached:
+                revenues[inn] = cached
+            else:
+                missing.append(inn)
+
+        for inn, financials in parser.iter_company_financials(missing):
+            if not financials:
+                continue
+            revenues[inn] = financials
+            if self.revenue_cache:
+                self.revenue_cache.set(inn, financials)
+
+        return revenues
+
+    def _crawl(self, parser: SiteParser, url: str, watches: List[Watch], now: float) -> Dict[int, SiteSnapshot]:
+        """Загрузка страницы и обновление снимков для всех подписок на URL.
+
+        Подписки без изменений и без необходимости обновить выручку
+        в результат не попадают.
+        """
+        budget = TimeBudget(self.url_timeout)
+        with parser.time_budget(budget):
+            snapshots = self._crawl_page(parser, url, watches, now)
+
+        # Неполные данные не сохраняем, чтобы не прислать ложные изменения
+        budget.check()
+        return snapshots
+
+    def _crawl_page(self, parser: SiteParser, url: str, watches: List[Watch], now: float) -> Dict[int, SiteSnapshot]:
+        parser.load_page(url)
+        content_hash = parser.page_content_hash()
+
+        changed = {w.id for w in watches if w.content_hash != content_hash}
+        revenue_due = {w.id for w in watches if now - w.revenue_checked >= self.revenue_refresh}
+        if not changed and not revenue_due:
+            return {}
+
+        phones, inns = None, None
+        if changed:
+            phones = sorted(parser.extract_phones())
+            inns = sorted(parser.extract_inn())
+
+        # ИНН, для которых нужен запрос выручки: новые или с истекшим сроком обновления
+        lookup = set()
+        for watch in watches:
+            if watch.id not in changed and watch.id not in revenue_due:
+                continue
+            current_inns = inns if watch.id in changed else watch.inns
+            for inn in current_inns:
+                if watch.id in revenue_due or inn not in watch.revenues:
+                    lookup.add(inn)
+        revenues = self._lookup_revenues(parser, sorted(lookup))
+        failed = lookup - set(revenues)
+
+        snapshots = {}
+        for watch in watches:
+            if watch.id not in changed and watch.id not in revenue_due:
+                continue
+
+            snapshot = SiteSnapshot(
+                content_hash=content_hash,
+                phones=phones if watch.id in changed else watch.phones,
+                inns=inns if watch.id in changed else watch.inns
+            )
+            # Неудачный запрос не считается изменением выручки: остается прежнее значение
+            for inn in snapshot.inns:
+                if inn in revenues:
+                    latest = revenues[inn].latest
+                    snapshot.revenues[inn] = latest.revenue if latest else None
+                    snapshot.reports[inn] = revenues[inn].format()
+                else:
+                    snapshot.revenues[inn] = watch.revenues.get(inn)
+
+            # При неудачных запросах выручка обновится при следующей проверке
+            if watch.id in revenue_due and not failed & set(snapshot.inns):
+                snapshot.revenue_checked = now
+            else:
+                snapshot.revenue_checked = watch.revenue_checked
+            snapshots[watch.id] = snapshot
+
+        return snapshots
+
+    async def run_once(self, parser: SiteParser):
+        """Обработка одной порции URL, срок проверки которых наступил"""
+        now = time.time()
+        for url in await asyncio.to_thread(self.store.due_urls, now, self.batch_size):
+            watches = await asyncio.to_thread(self.store.for_url, url)
+            failed = False
+            try:
+                snapshots = await SiteParser.run_in_browser_thread(self._crawl, parser, url, watches, now)
+            except Exception as e:
+                print(f"Ошибка повторной проверки {url}: {str(e)}")
+                snapshots = {}
+                failed = True
+
+            # Проверка URL попадает в архив один раз, сколько бы чатов на него ни подписалось
+            if snapshots and self.results_store:
+                snapshot = next(iter(snapshots.values()))
+                reports = {}
+                for item in snapshots.values():
+                    reports.update(item.reports)
+                try:
+                    await asyncio.to_thread(self.results_store.save_results, [{
+                        'url': url,
+                        'phones': snapshot.phones,
+                        'inns': snapshot.inns,
+                        'revenues': reports,
+                        'skipped': False
+                    }], None, "watch")
+                except Exception as e:
+                    print(f"Не удалось сохранить результаты проверки {url}: {str(e)}")
+
+            # Все подписки на URL переносятся на один и тот же срок
+            next_check = self._next_check(now, failed)
+            for watch in watches:
+                snapshot = snapshots.get(watch.id)
+                if snapshot is None:
+                    await asyncio.to_thread(self.store.reschedule, watch.id, next_check)
+                    continue
+
+                await asyncio.to_thread(self.store.save_snapshot, watch.id, snapshot, next_check)
+
+                # Первая проверка только фиксирует исходное состояние
+                if watch.content_hash is None:
+                    continue
+
+                diff = WatchDiff.between(watch, snapshot)
+                if not diff.is_empty:
+                    try:
+                        await self.notify(watch.chat_id, diff)
+                    except Exception as e:
+                        print(f"Не удалось отправить изменения по {url}: {str(e)}")
+
+    async def run(self):
+        """Бесконечный цикл планировщика; браузер запускается только при наличии работы"""
+        while True:
+            try:
+                if await asyncio.to_thread(self.store.due_urls, time.time(), 1):
+                    parser = await SiteParser.run_in_browser_thread(
+                        SiteParser, revenue_cache=self.revenue_cache, max_tabs=self.max_tabs)
+                    try:
+                        while await asyncio.to_thread(self.store.due_urls, time.time(), 1):
+                            await self.run_once(parser)
+                    finally:
+                        await SiteParser.run_in_browser_thread(parser.close)
+            except Exception as e:
+                print(f"Ошибка планировщика отслеживания: {str(e)}")
+            await asyncio.sleep(self.tick)
@@ -1,12 +1,20 @@
+import asyncio
 import base64
+import functools
+import hashlib
+import json
 import os
 import re
 import time
 import random
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from selenium.webdriver import ActionChains
 from twocaptcha import TwoCaptcha
-from typing import Set, Dict, Optional
+from typing import List, Set, Dict, Optional, Callable, Iterator, AsyncIterator, Tuple, Union
 from urllib.parse import urlparse
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -18,6 +26,144 @@ from fake_useragent import UserAgent
 from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 
+from phone_numbering import NumberingPlan
+from browser_profiles import ProfilePool
+from company_financials import CompanyFinancials, FinancialYear, FinancialsParser
+
+
+class BudgetExceeded(Exception):
+    """Истекло отведенное время или обработка отменена"""
+
+
+class TimeBudget:
+    """Ограничение времени обработки с поддержкой отмены из другого потока.
+
+    Дочерний бюджет никогда не переживает родительский и отменяется вместе с ним.
+    Завершенный дочерний бюджет нужно отвязать от родителя (release или with),
+    иначе родитель хранит ссылки на все созданные из него бюджеты.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional['TimeBudget'] = None):
+        self._deadline = time.monotonic() + seconds if seconds else None
+        if parent is not None and parent._deadline is not None:
+            self._deadline = min(self._deadline or parent._deadline, parent._deadline)
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._parent = parent
+        if parent is not None:
+            parent.on_cancel(self.cancel)
+
+    def __enter__(self) -> 'TimeBudget':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def child(self, seconds: Optional[float] = None) -> 'TimeBudget':
+        return TimeBudget(seconds, parent=self)
+
+    def release(self):
+        """Отвязка от родителя после завершения работы; срок родителя по-прежнему действует"""
+        parent, self._parent = self._parent, None
+        if parent is not None:
+            parent.remove_on_cancel(self.cancel)
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """Регистрация действия при отмене; если бюджет уже отменен, оно выполняется сразу"""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_on_cancel(self, callback: Callable[[], None]):
+        with self._lock:
+            try:
+                self._callbacks.remove(callback)
+            except ValueError:
+                pass
+
+    def cancel(self):
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Ошибка при отмене обработки: {str(e)}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def remaining(self) -> Optional[float]:
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled:
+            raise BudgetExceeded("Обработка отменена")
+        if self.expired:
+            raise BudgetExceeded("Превышено время обработки")
+
+    def timeout(self, default: float) -> float:
+        """Таймаут ожидания, урезанный до оставшегося времени"""
+        self.check()
+        remaining = self.remaining()
+        return default if remaining is None else max(0.1, min(default, remaining))
+
+    def sleep(self, seconds: float):
+        """Пауза, которая прерывается при отмене или истечении бюджета"""
+        remaining = self.remaining()
+        self._cancelled.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+
+@dataclass
+class PhonesFound:
+    """На странице сайта найдены телефоны"""
+    index: int
+    url: str
+    phones: List[str]
+
+
+@dataclass
+class InnsFound:
+    """На странице сайта найдены ИНН"""
+    index: int
+    url: str
+    inns: List[str]
+
+
+@dataclass
+class RevenueFound:
+    """Получены финансовые данные по одному ИНН сайта"""
+    index: int
+    url: str
+    inn: str
+    revenue: str
+
+
+@dataclass
+class SiteDone:
+    """Обработка сайта завершена; result совпадает с результатом extract_contacts"""
+    index: int
+    url: str
+    result: Dict[str, any]
+
+
+ContactEvent = Union[PhonesFound, InnsFound, RevenueFound, SiteDone]
+
 
 class SiteParser:
     # Домены, которые нужно пропускать
@@ -32,21 +178,54 @@ class SiteParser:
         'instagram.com'
     }
 
-    def __init__(self, headless: bool = True):
+    # Оценка потребления памяти для подбора числа вкладок
+    BROWSER_BASE_MEMORY_MB = 300
+    TAB_MEMORY_MB = 150
+    MAX_TABS = 8
+    PAGE_LOAD_TIMEOUT = 20
+    NAVIGATION_TIMEOUT = 300
+
+    # Потоки для блокирующей работы с браузерами: по одному на параллельный запрос или воркер
+    BROWSER_THREADS = 10
+    _browser_executor: Optional[ThreadPoolExecutor] = None
+
+    # Адрес можно переопределить для нагрузочного теста с локальной заглушкой
+    DATANEWTON_URL = os.getenv('DATANEWTON_URL', 'https://datanewton.ru').rstrip('/')
+
+    # Финансовые данные читаются из JSON-ответов datanewton.ru через журнал сети CDP
+    NETWORK_CAPTURE = os.getenv('DATANEWTON_NETWORK_CAPTURE', '1') != '0'
+    NETWORK_CAPTURE_TIMEOUT = 8
+
+    def __init__(self, headless: bool = True, revenue_cache=None, max_tabs: int = 1,
+                 profile_pool: Optional[ProfilePool] = None):
         self.ua = UserAgent()
-        chrome_options = Options()
-        chrome_options.add_argument(f"user-agent={self.ua.random}")
-        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        chrome_options.add_experimental_option('useAutomationExtension', False)
-        if headless:
-            chrome_options.add_argument("--headless=new")
+        self.revenue_cache = revenue_cache
+        self.max_tabs = max(1, min(max_tabs, self.MAX_TABS))
 
-        # Автоматическая установка правильной версии ChromeDriver
-        service = Service(ChromeDriverManager().install())
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        # close() вызывается и из потока отмены, и при выходе из with в рабочем потоке
+        self._close_lock = threading.Lock()
+
+        # Постоянный профиль сохраняет cookies и кэш; если свободных нет — одноразовый
+        self.profile_pool = profile_pool or ProfilePool.default()
+        self.profile = self.profile_pool.lease() if self.profile_pool else None
+        # Ответы datanewton.ru по вкладкам: requestId -> загрузка завершена
+        self._network_responses: Dict[str, Dict[str, bool]] = {}
+
+        try:
+            self.driver = self._start_driver(headless)
+        except Exception as e:
+            if not self.profile:
+                raise
+            # Профиль, который Chrome не открыл (например, его держит осиротевший процесс),
+            # откладывается, чтобы пул не выдал его следующему браузеру; пробуем одноразовый
+            print(f"Chrome не запустился с профилем {self.profile.name}: {str(e)}")
+            with self._close_lock:
+                profile, self.profile = self.profile, None
+            self.profile_pool.discard(profile)
+            self.driver = self._start_driver(headless)
 
         self.wait = WebDriverWait(self.driver, 20)
+        self.main_handle = self.driver.current_window_handle
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
 
         if os.getenv('RUCAPTCHA_API_KEY'):
@@ -55,6 +234,29 @@ class SiteParser:
             self.captcha_solver = None
 
         self.captcha_attempts = 3
+        self.budget: Optional[TimeBudget] = None
+        self.numbering_plan = NumberingPlan.default()
+
+    def _start_driver(self, headless: bool):
+        """Запуск Chrome с текущим профилем или с одноразовым, если профиля нет"""
+        chrome_options = Options()
+        if self.profile:
+            for argument in self.profile_pool.chrome_arguments(self.profile):
+                chrome_options.add_argument(argument)
+        else:
+            chrome_options.add_argument(f"user-agent={self.ua.random}")
+        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+        if headless:
+            chrome_options.add_argument("--headless=new")
+        if self.NETWORK_CAPTURE:
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            chrome_options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+
+        # Автоматическая установка правильной версии ChromeDriver
+        service = Service(ChromeDriverManager().install())
+        return webdriver.Chrome(service=service, options=chrome_options)
 
     def __enter__(self):
         return self
@@ -62,9 +264,76 @@ class SiteParser:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    @classmethod
+    def configure_browser_threads(cls, threads: int):
+        """Размер пула потоков для браузеров; вызывается при запуске до первой задачи"""
+        cls.BROWSER_THREADS = max(1, threads)
+        if cls._browser_executor is not None:
+            cls._browser_executor.shutdown(wait=False)
+            cls._browser_executor = None
+
+    @classmethod
+    def browser_executor(cls) -> ThreadPoolExecutor:
+        """Общий пул потоков для Selenium.
+
+        Отдельный от пула asyncio по умолчанию, чтобы долгие запросы браузеров
+        не занимали потоки, нужные для отмены и работы с базой данных.
+        """
+        if cls._browser_executor is None:
+            cls._browser_executor = ThreadPoolExecutor(
+                max_workers=cls.BROWSER_THREADS, thread_name_prefix='browser')
+        return cls._browser_executor
+
+    @classmethod
+    async def run_in_browser_thread(cls, func: Callable, *args, **kwargs):
+        """Аналог asyncio.to_thread в пуле потоков браузеров"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls.browser_executor(), functools.partial(func, *args, **kwargs))
+
+    @classmethod
+    def tabs_for_memory(cls, budget_mb: int) -> int:
+        """Число вкладок, которое помещается в бюджет памяти одного браузера"""
+        tabs = (budget_mb - cls.BROWSER_BASE_MEMORY_MB) // cls.TAB_MEMORY_MB
+        return max(1, min(tabs, cls.MAX_TABS))
+
+    @contextmanager
+    def time_budget(self, budget: Optional[TimeBudget]):
+        """Ограничение всех ожиданий драйвера бюджетом времени"""
+        previous = self.budget
+        self.budget = budget or previous
+        try:
+            yield self.budget
+        finally:
+            self.budget = previous
+
+    def _check_budget(self):
+        if self.budget:
+            self.budget.check()
+
+    def _timeout(self, default: float) -> float:
+        return self.budget.timeout(default) if self.budget else default
+
+    def _wait(self, default: float = 20) -> WebDriverWait:
+        return WebDriverWait(self.driver, self._timeout(default))
+
+    def _sleep(self, seconds: float):
+        if self.budget:
+            self.budget.sleep(seconds)
+        else:
+            time.sleep(seconds)
+
+    def _get(self, url: str):
+        """Переход по URL с таймаутом загрузки в пределах бюджета"""
+        self.driver.set_page_load_timeout(self._timeout(self.NAVIGATION_TIMEOUT))
+        try:
+            self.driver.get(url)
+        except TimeoutException:
+            self._check_budget()
+            raise
+
     def human_like_delay(self):
         """Случайная задержка между действиями"""
-        time.sleep(random.uniform(1.0, 3.0))
+        self._sleep(random.uniform(1.0, 3.0))
 
     def solve_yandex_captcha(self):
         """Решение Яндекс капчи"""
@@ -72,16 +341,16 @@ class SiteParser:
             # Проверяем наличие чекбокс-капчи "Я не робот"
             if len(self.driver.find_elements(By.CSS_SELECTOR, '.CheckboxCaptcha')) > 0:
                 print("Обнаружена чекбокс-капча")
-                checkbox = self.wait.until(
+                checkbox = self._wait().until(
                     EC.element_to_be_clickable((By.CSS_SELECTOR, '.CheckboxCaptcha-Button')))
                 checkbox.click()
                 print("Чекбокс 'Я не робот' отмечен")
-                time.sleep(random.uniform(2, 3))
+                self._sleep(random.uniform(2, 3))
 
             # Проверяем наличие графической капчи
             if len(self.driver.find_elements(By.CSS_SELECTOR, '.AdvancedCaptcha')) > 0:
                 print("Обнаружена графическая капча")
-                captcha_element = self.wait.until(
+                captcha_element = self._wait().until(
                     EC.visibility_of_element_located((By.CSS_SELECTOR, '.AdvancedCaptcha-Image')))
                 captcha_path = 'captcha.png'
                 captcha_element.screenshot(captcha_path)
@@ -117,7 +386,7 @@ class SiteParser:
 
                     # Ожидаем решения
                     for _ in range(24):
-                        time.sleep(5)
+                        self._sleep(5)
                         result_response = requests.post(
                             'https://api.rucaptcha.com/getTaskResult',
                             json={
@@ -148,17 +417,19 @@ class SiteParser:
                         action.move_to_element_with_offset(
                             captcha_element, x, y
                         ).pause(random.uniform(0.1, 0.3)).click().perform()
-                        time.sleep(random.uniform(0.2, 0.5))
+                        self._sleep(random.uniform(0.2, 0.5))
 
-                    submit = self.wait.until(
+                    submit = self._wait().until(
                         EC.element_to_be_clickable((By.CSS_SELECTOR, '.AdvancedCaptcha-Submit')))
                     submit.click()
 
-                    self.wait.until(EC.invisibility_of_element_located(
+                    self._wait().until(EC.invisibility_of_element_located(
                         (By.CSS_SELECTOR, '.AdvancedCaptcha')))
                     print("Капча успешно пройдена")
                     return True
 
+                except BudgetExceeded:
+                    raise
                 except Exception as e:
                     print(f"Ошибка при работе с RuCaptcha API: {str(e)}")
                     return False
@@ -168,6 +439,8 @@ class SiteParser:
 
             return True
 
+        except BudgetExceeded:
+            raise
         except Exception as e:
             print(f"Критическая ошибка при обработке капчи: {str(e)}")
             self.driver.save_screenshot('captcha_error.png')
@@ -225,12 +498,13 @@ class SiteParser:
         except:
             pass
 
-        # Нормализация и валидация
+        # Нормализация и валидация по плану нумерации: отсекает даты,
+        # артикулы и другие фрагменты, похожие на телефон
         normalized_phones = set()
         for phone in phones:
-            norm_phone = self.normalize_phone(phone)
-            if norm_phone.startswith('+7') and len(norm_phone) == 12:
-                normalized_phones.add(norm_phone)
+            info = self.numbering_plan.lookup(self.normalize_phone(phone))
+            if info:
+                normalized_phones.add(info.phone)
 
         return normalized_phones
 
@@ -282,140 +556,607 @@ class SiteParser:
 
         return inns
 
-    def get_company_revenue(self, inn: str) -> Optional[str]:
-        """Получение выручки компании по ИНН с datanewton.ru"""
+    @staticmethod
+    def _revenue_search_url(inn: str) -> str:
+        return f"{SiteParser.DATANEWTON_URL}/search?query={inn}&type=ul"
+
+    def _open_first_company(self, inn: str) -> bool:
+        """Переход к первой компании в результатах поиска datanewton.ru в текущей вкладке"""
         try:
-            # 1. Выполняем поиск по ИНН
-            search_url = f"https://datanewton.ru/search?query={inn}&type=ul"
-            self.driver.get(search_url)
-            self.human_like_delay()
+            # Ждем появления списка компаний
+            self._wait(15).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, ".list-group.list-group-flush"))
+            )
+
+            # Проверяем, есть ли результаты
+            no_results = self.driver.find_elements(By.XPATH, "//*[contains(text(), 'ничего не найдено')]")
+            if no_results:
+                print(f"Компания с ИНН {inn} не найдена на datanewton.ru")
+                return False
+
+            # Находим и кликаем первую компанию в списке
+            first_company = self._wait(15).until(
+                EC.element_to_be_clickable(
+                    (By.CSS_SELECTOR, ".list-group.list-group-flush a.list-group-item:first-child"))
+            )
+            # Ответы страницы поиска не относятся к карточке компании
+            self._forget_network_responses(self.driver.current_window_handle)
+            first_company.click()
+            return True
 
-            # 2. Кликаем по первой найденной компании
-            try:
-                # Ждем появления списка компаний
-                WebDriverWait(self.driver, 15).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, ".list-group.list-group-flush"))
-                )
+        except TimeoutException:
+            print(f"Не удалось найти компанию с ИНН {inn} в результатах поиска")
+            return False
 
-                # Проверяем, есть ли результаты
-                no_results = self.driver.find_elements(By.XPATH, "//*[contains(text(), 'ничего не найдено')]")
-                if no_results:
-                    print(f"Компания с ИНН {inn} не найдена на datanewton.ru")
-                    return None
+    def _is_datanewton_url(self, url: str) -> bool:
+        host = urlparse(url).hostname or ''
+        base = urlparse(self.DATANEWTON_URL).hostname or ''
+        return host == base or host.endswith(f".{base}")
 
-                # Находим и кликаем первую компанию в списке
-                first_company = WebDriverWait(self.driver, 15).until(
-                    EC.element_to_be_clickable(
-                        (By.CSS_SELECTOR, ".list-group.list-group-flush a.list-group-item:first-child"))
-                )
-                first_company.click()
-                self.human_like_delay()
+    @staticmethod
+    def _webview_id(handle: str) -> str:
+        # Дескриптор окна совпадает с идентификатором цели DevTools (в старых версиях — с префиксом)
+        return handle.replace('CDwindow-', '')
+
+    def _drain_network_log(self):
+        """Перенос JSON-ответов datanewton.ru из журнала производительности в буфер вкладок.
+
+        Журнал общий для всех вкладок и очищается при чтении, поэтому
+        остальные события отбрасываются, чтобы он не рос между запросами.
+        """
+        if not self.NETWORK_CAPTURE:
+            return
+        try:
+            entries = self.driver.get_log('performance')
+        except Exception:
+            return
 
-                # 3. Ждем загрузки страницы компании и данных о выручке
-                try:
-                    WebDriverWait(self.driver, 15).until(
-                        EC.presence_of_element_located((By.XPATH, "//div[contains(text(),'Выручка')]"))
-                    )
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])
+                event = message['message']
+                webview = message.get('webview', '')
+                params = event.get('params', {})
+            except (KeyError, TypeError, ValueError):
+                continue
 
-                    # 4. Извлекаем значение выручки
-                    revenue_element = self.driver.find_element(
-                        By.XPATH, "//div[contains(text(),'Выручка')]/following-sibling::div"
-                    )
-                    revenue = revenue_element.text.strip()
+            if event.get('method') == 'Network.responseReceived':
+                response = params.get('response', {})
+                if 'json' in response.get('mimeType', '') and self._is_datanewton_url(response.get('url', '')):
+                    self._network_responses.setdefault(webview, {})[params.get('requestId')] = False
+            elif event.get('method') == 'Network.loadingFinished':
+                responses = self._network_responses.get(webview, {})
+                if params.get('requestId') in responses:
+                    responses[params['requestId']] = True
+
+    def _forget_network_responses(self, handle: str):
+        self._drain_network_log()
+        self._network_responses.pop(self._webview_id(handle), None)
+
+    def _captured_payloads(self, handle: str) -> List:
+        """Разобранные JSON-ответы, полностью загруженные во вкладке (текущей)"""
+        self._drain_network_log()
+        responses = self._network_responses.get(self._webview_id(handle), {})
+        payloads = []
+        for request_id in [request_id for request_id, finished in responses.items() if finished]:
+            del responses[request_id]
+            try:
+                response = self.driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                body = response.get('body', '')
+                if response.get('base64Encoded'):
+                    body = base64.b64decode(body).decode('utf-8', errors='ignore')
+                payloads.append(json.loads(body))
+            except Exception as e:
+                print(f"Не удалось прочитать ответ datanewton.ru: {str(e)}")
+        return payloads
+
+    def _read_financials_from_network(self, inn: str) -> Tuple[Optional[CompanyFinancials], bool]:
+        """Финансовые показатели из JSON-ответов страницы компании без ожидания отрисовки.
+
+        Возвращает показатели и признак того, что среди ответов есть финансовая
+        отчетность этой компании: если она пришла без выручки, читать страницу
+        бессмысленно. Карточка без отчетности или служебные запросы этого признака
+        не дают, и тогда показатели читаются со страницы.
+        """
+        if not self.NETWORK_CAPTURE:
+            return None, False
+
+        handle = self.driver.current_window_handle
+        deadline = time.monotonic() + self._timeout(self.NETWORK_CAPTURE_TIMEOUT)
+        payloads = []
+        settled_at = None
+        while True:
+            received = self._captured_payloads(handle)
+            payloads.extend(received)
+            financials = FinancialsParser.from_payloads(inn, payloads)
+            if financials:
+                return financials, True
+
+            # Ответы получены и новых запросов нет секунду — страница загрузила все данные
+            pending = self._network_responses.get(self._webview_id(handle))
+            if received or pending or not payloads:
+                settled_at = None
+            elif settled_at is None:
+                settled_at = time.monotonic()
+            elif time.monotonic() - settled_at >= 1:
+                break
+
+            if time.monotonic() >= deadline:
+                break
+            self._sleep(0.3)
+
+        if FinancialsParser.has_financials(inn, payloads):
+            print(f"В отчетности datanewton.ru нет выручки для ИНН {inn}")
+            return None, True
+        print(f"В ответах datanewton.ru нет отчетности для ИНН {inn}, читаю страницу")
+        return None, False
+
+    def _read_financials(self, inn: str) -> Optional[CompanyFinancials]:
+        """Финансовые показатели компании в текущей вкладке: из сети, а без отчетности в JSON — со страницы"""
+        financials, recognized = self._read_financials_from_network(inn)
+        if financials or recognized:
+            return financials
+        return self._read_financials_from_page(inn)
+
+    def _read_financials_from_page(self, inn: str) -> Optional[CompanyFinancials]:
+        """Чтение финансовых показателей из разметки страницы компании в текущей вкладке"""
+        try:
+            self._wait(15).until(
+                EC.presence_of_element_located((By.XPATH, "//div[contains(text(),'Выручка')]"))
+            )
 
-                    # Дополнительно пытаемся получить другие финансовые показатели
-                    financial_data = {'Выручка': revenue}
+            # Извлекаем значение выручки
+            revenue_element = self.driver.find_element(
+                By.XPATH, "//div[contains(text(),'Выручка')]/following-sibling::div"
+            )
+            revenue = revenue_element.text.strip()
 
-                    try:
-                        profit_element = self.driver.find_element(
-                            By.XPATH, "//div[contains(text(),'Чистая прибыль')]/following-sibling::div"
-                        )
-                        financial_data['Чистая прибыль'] = profit_element.text.strip()
-                    except:
-                        pass
+            # Дополнительно пытаемся получить другие финансовые показатели
+            financial_data = {'Выручка': revenue}
 
-                    try:
-                        employees_element = self.driver.find_element(
-                            By.XPATH, "//div[contains(text(),'Сотрудники')]/following-sibling::div"
-                        )
-                        financial_data['Сотрудники'] = employees_element.text.strip()
-                    except:
-                        pass
+            try:
+                profit_element = self.driver.find_element(
+                    By.XPATH, "//div[contains(text(),'Чистая прибыль')]/following-sibling::div"
+                )
+                financial_data['Чистая прибыль'] = profit_element.text.strip()
+            except:
+                pass
 
-                    # Форматируем результат
-                    if len(financial_data) == 1:
-                        return f"Выручка: {revenue}"
-                    else:
-                        return "\n".join([f"{k}: {v}" for k, v in financial_data.items()])
+            try:
+                employees_element = self.driver.find_element(
+                    By.XPATH, "//div[contains(text(),'Сотрудники')]/following-sibling::div"
+                )
+                financial_data['Сотрудники'] = employees_element.text.strip()
+            except:
+                pass
 
-                except TimeoutException:
-                    print(f"Не удалось найти данные о выручке для ИНН {inn}")
-                    return None
+            # Форматируем результат
+            if len(financial_data) == 1:
+                text = f"Выручка: {revenue}"
+            else:
+                text = "\n".join([f"{k}: {v}" for k, v in financial_data.items()])
+
+            employees = FinancialsParser.parse_amount(financial_data.get('Сотрудники'))
+            return CompanyFinancials(
+                inn=inn,
+                years=[FinancialYear(
+                    None,
+                    FinancialsParser.parse_amount(revenue),
+                    FinancialsParser.parse_amount(financial_data.get('Чистая прибыль'))
+                )],
+                employees=int(employees) if employees is not None else None,
+                source="page",
+                text=text
+            )
+
+        except TimeoutException:
+            print(f"Не удалось найти данные о выручке для ИНН {inn}")
+            return None
 
-            except TimeoutException:
-                print(f"Не удалось найти компанию с ИНН {inn} в результатах поиска")
+    def get_company_financials(self, inn: str) -> Optional[CompanyFinancials]:
+        """Получение финансовых показателей компании по ИНН с datanewton.ru"""
+        try:
+            self._get(self._revenue_search_url(inn))
+            self.human_like_delay()
+
+            if not self._open_first_company(inn):
                 return None
+            if not self.NETWORK_CAPTURE:
+                self.human_like_delay()
 
+            return self._read_financials(inn)
+
+        except BudgetExceeded:
+            raise
         except Exception as e:
             print(f"Ошибка при получении данных для ИНН {inn}: {str(e)}")
             return None
 
-    def extract_contacts(self, url: str) -> Dict[str, any]:
-        """Основной метод извлечения контактов с проверкой на нежелательные домены"""
-        if self.should_skip_url(url):
-            print(f"Пропускаем URL (в черном списке): {url}")
-            return {
-                'url': url,
-                'phones': [],
-                'inns': [],
-                'revenues': {},
-                'skipped': True
-            }
-
-        result = {
+    def get_company_revenue(self, inn: str) -> Optional[str]:
+        """Получение выручки компании по ИНН с datanewton.ru в виде текста отчета"""
+        financials = self.get_company_financials(inn)
+        return financials.format() if financials else None
+
+    def iter_company_financials(self, inns: List[str], budget: Optional[TimeBudget] = None
+                                ) -> Iterator[Tuple[str, Optional[CompanyFinancials]]]:
+        """Поочередная выдача финансовых показателей (ИНН, данные или None) по мере получения.
+
+        ИНН запрашиваются группами в параллельных вкладках. При истечении
+        или отмене бюджета генератор завершается, и необработанные ИНН
+        не выдаются: None означает, что данных действительно нет.
+        Пока генератор не исчерпан, другие методы парсера вызывать нельзя.
+        """
+        with self.time_budget(budget):
+            for start in range(0, len(inns), self.max_tabs):
+                chunk = inns[start:start + self.max_tabs]
+                tabs = []
+                try:
+                    self._check_budget()
+                    tabs = [(self._open_tab(self._revenue_search_url(inn)), inn) for inn in chunk]
+                    self._wait_tabs_loaded([handle for handle, _ in tabs if handle])
+                    self.human_like_delay()
+
+                    opened = []
+                    for handle, inn in tabs:
+                        if not handle:
+                            self._check_budget()
+                            yield inn, None
+                            continue
+                        try:
+                            self.driver.switch_to.window(handle)
+                            if self._open_first_company(inn):
+                                opened.append((handle, inn))
+                                continue
+                        except BudgetExceeded:
+                            raise
+                        except Exception as e:
+                            print(f"Ошибка при получении данных для ИНН {inn}: {str(e)}")
+                        # Таймаут ожидания или закрытый при отмене драйвер — не отсутствие данных
+                        self._check_budget()
+                        yield inn, None
+
+                    # Ответы datanewton.ru ждем в самом чтении, без паузы на отрисовку
+                    if opened and not self.NETWORK_CAPTURE:
+                        self.human_like_delay()
+
+                    for handle, inn in opened:
+                        financials = None
+                        try:
+                            self.driver.switch_to.window(handle)
+                            financials = self._read_financials(inn)
+                        except BudgetExceeded:
+                            raise
+                        except Exception as e:
+                            print(f"Ошибка при получении данных для ИНН {inn}: {str(e)}")
+                        if financials is None:
+                            self._check_budget()
+                        yield inn, financials
+                except BudgetExceeded as e:
+                    print(f"Получение финансовых данных прервано: {str(e)}")
+                    return
+                finally:
+                    self._close_tabs([handle for handle, _ in tabs if handle])
+
+    def iter_company_revenues(self, inns: List[str],
+                              budget: Optional[TimeBudget] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """Поочередная выдача выручки (ИНН, текст отчета или None) по мере получения"""
+        for inn, financials in self.iter_company_financials(inns, budget):
+            yield inn, financials.format() if financials else None
+
+    def get_company_revenues(self, inns: List[str],
+                             budget: Optional[TimeBudget] = None) -> Dict[str, Optional[str]]:
+        """Получение выручки для нескольких ИНН в параллельных вкладках.
+
+        При истечении бюджета возвращаются уже полученные данные,
+        для остальных ИНН — None.
+        """
+        results = dict(self.iter_company_revenues(inns, budget))
+        return {inn: results.get(inn) for inn in inns}
+
+    def load_page(self, url: str):
+        """Загрузка страницы с прокруткой и обработкой капчи"""
+        self._get(url)
+        self.human_like_delay()
+
+        # Прокрутка для загрузки всего контента
+        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
+        self.human_like_delay()
+
+        # Проверяем наличие капчи
+        if self.driver.find_elements(By.CSS_SELECTOR, '.AdvancedCaptcha'):
+            self.solve_yandex_captcha()
+
+        self._drain_network_log()
+
+    def page_content_hash(self) -> str:
+        """Хэш видимого текста загруженной страницы без учета пробелов"""
+        text = self.driver.find_element(By.TAG_NAME, 'body').text
+        normalized = re.sub(r'\s+', ' ', text).strip()
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    def _open_tab(self, url: str) -> Optional[str]:
+        """Открытие URL в новой вкладке без ожидания загрузки"""
+        try:
+            known = set(self.driver.window_handles)
+            self.driver.execute_script("window.open(arguments[0], '_blank');", url)
+            new_handles = [h for h in self.driver.window_handles if h not in known]
+            return new_handles[0] if new_handles else None
+        except Exception as e:
+            print(f"Не удалось открыть вкладку для {url}: {str(e)}")
+            return None
+
+    def _wait_tabs_loaded(self, handles: List[str]):
+        """Ожидание загрузки всех вкладок, страницы грузятся одновременно"""
+        # Пока вкладка грузится, драйвер задерживает переключение на нее до таймаута загрузки
+        self.driver.set_page_load_timeout(self._timeout(self.PAGE_LOAD_TIMEOUT))
+        deadline = time.monotonic() + self._timeout(self.PAGE_LOAD_TIMEOUT)
+        pending = list(handles)
+        while pending and time.monotonic() < deadline:
+            for handle in list(pending):
+                try:
+                    self.driver.switch_to.window(handle)
+                    if self.driver.execute_script("return document.readyState") == "complete":
+                        pending.remove(handle)
+                except Exception:
+                    pending.remove(handle)
+            if pending:
+                self._sleep(0.5)
+        self._check_budget()
+
+    def _close_tabs(self, handles: List[str]):
+        """Закрытие вкладок и возврат в основную"""
+        for handle in handles:
+            self._forget_network_responses(handle)
+            try:
+                self.driver.switch_to.window(handle)
+                self.driver.close()
+            except Exception:
+                pass
+        try:
+            self.driver.switch_to.window(self.main_handle)
+        except Exception:
+            pass
+
+    def _iter_revenues(self, inns: List[str],
+                       budget: Optional[TimeBudget] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """Выручка с учетом кэша: сначала кэшированные ИНН, затем запросы к datanewton.ru"""
+        missing = []
+        for inn in inns:
+            financials = self.revenue_cache.get(inn) if self.revenue_cache else None
+            if financials:
+                yield inn, financials.format()
+            else:
+                missing.append(inn)
+
+        for inn, financials in self.iter_company_financials(missing, budget):
+            if self.revenue_cache:
+                self.revenue_cache.set(inn, financials)
+            yield inn, financials.format() if financials else None
+
+    @staticmethod
+    def _empty_result(url: str, skipped: bool = False) -> Dict[str, any]:
+        return {
             'url': url,
             'phones': [],
             'inns': [],
             'revenues': {},
-            'skipped': False
+            'skipped': skipped,
+            'timed_out': False
         }
 
-        try:
-            self.driver.get(url)
-            self.human_like_delay()
+    def iter_contacts(self, url: str, budget: Optional[TimeBudget] = None) -> Iterator[ContactEvent]:
+        """Потоковое извлечение контактов одного сайта.
 
-            # Прокрутка для загрузки всего контента
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
-            self.human_like_delay()
+        Телефоны и ИНН выдаются сразу после загрузки страницы, выручка —
+        по каждому ИНН отдельно, последним всегда идет SiteDone.
+        """
+        if self.should_skip_url(url):
+            print(f"Пропускаем URL (в черном списке): {url}")
+            yield SiteDone(0, url, self._empty_result(url, skipped=True))
+            return
 
-            # Проверяем наличие капчи
-            if self.driver.find_elements(By.CSS_SELECTOR, '.AdvancedCaptcha'):
-                self.solve_yandex_captcha()
+        result = self._empty_result(url)
 
-            phones = self.extract_phones()
-            inns = self.extract_inn()
+        with self.time_budget(budget):
+            try:
+                self.load_page(url)
 
-            result['phones'] = sorted(phones)
-            result['inns'] = sorted(inns)
+                result['phones'] = sorted(self.extract_phones())
+                yield PhonesFound(0, url, result['phones'])
 
-            # Получаем финансовые данные для каждого найденного ИНН
-            for inn in inns:
-                revenue_data = self.get_company_revenue(inn)
-                if revenue_data:
-                    result['revenues'][inn] = revenue_data
-                else:
-                    result['revenues'][inn] = "Финансовые данные не найдены"
+                result['inns'] = sorted(self.extract_inn())
+                yield InnsFound(0, url, result['inns'])
 
-            return result
+                # Получаем финансовые данные для каждого найденного ИНН
+                for inn, revenue_data in self._iter_revenues(result['inns']):
+                    result['revenues'][inn] = revenue_data or "Финансовые данные не найдены"
+                    yield RevenueFound(0, url, inn, result['revenues'][inn])
 
-        except Exception as e:
-            print(f"Ошибка обработки {url}: {str(e)}")
-            return result
+                self._check_budget()
 
+            except BudgetExceeded as e:
+                print(f"Обработка {url} прервана: {str(e)}")
+                result['timed_out'] = True
+            except Exception as e:
+                print(f"Ошибка обработки {url}: {str(e)}")
 
-    def close(self):
-        """Закрытие драйвера"""
+        for inn in result['inns']:
+            result['revenues'].setdefault(inn, "Финансовые данные не найдены")
+        yield SiteDone(0, url, result)
+
+    def extract_contacts(self, url: str, budget: Optional[TimeBudget] = None) -> Dict[str, any]:
+        """Основной метод извлечения контактов с проверкой на нежелательные домены"""
+        for event in self.iter_contacts(url, budget):
+            if isinstance(event, SiteDone):
+                return event.result
+
+    def iter_contacts_many(self, urls: List[str], budget: Optional[TimeBudget] = None,
+                           url_timeout: Optional[float] = None) -> Iterator[ContactEvent]:
+        """Потоковое извлечение контактов с нескольких сайтов в параллельных вкладках.
+
+        Сайты загружаются группами по max_tabs вкладок. Телефоны и ИНН
+        выдаются сразу после извлечения из вкладки, затем выручка по ИНН
+        группы, и SiteDone — как только по сайту получены все данные.
+        На загрузку группы и на ее финансовые данные отводится по url_timeout
+        секунд в пределах общего бюджета; прерванные сайты помечаются
+        флагом timed_out. Поле index события — позиция URL во входном списке.
+        """
+        budget = budget or self.budget or TimeBudget()
+        results = []
+        for index, url in enumerate(urls):
+            skipped = self.should_skip_url(url)
+            results.append(self._empty_result(url, skipped=skipped))
+            if skipped:
+                print(f"Пропускаем URL (в черном списке): {url}")
+                yield SiteDone(index, url, results[index])
+
+        pending = [index for index, result in enumerate(results) if not result['skipped']]
+        for start in range(0, len(pending), self.max_tabs):
+            chunk = pending[start:start + self.max_tabs]
+            extracted = []
+            tabs = []
+            chunk_budget = budget.child(url_timeout)
+            with self.time_budget(chunk_budget):
+                try:
+                    self._check_budget()
+                    tabs = [(self._open_tab(results[index]['url']), index) for index in chunk]
+                    self._wait_tabs_loaded([handle for handle, _ in tabs if handle])
+
+                    # Прокрутка во всех вкладках, затем одна общая задержка
+                    for handle, index in tabs:
+                        if not handle:
+                            continue
+                        try:
+                            self.driver.switch_to.window(handle)
+                            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
+                        except Exception as e:
+                            print(f"Ошибка обработки {results[index]['url']}: {str(e)}")
+                    self.human_like_delay()
+
+                    for handle, index in tabs:
+                        if not handle:
+                            continue
+                        result = results[index]
+                        try:
+                            self.driver.switch_to.window(handle)
+                            if self.driver.find_elements(By.CSS_SELECTOR, '.AdvancedCaptcha'):
+                                self.solve_yandex_captcha()
+                            result['phones'] = sorted(self.extract_phones())
+                            result['inns'] = sorted(self.extract_inn())
+                            extracted.append(index)
+                        except BudgetExceeded:
+                            raise
+                        except Exception as e:
+                            print(f"Ошибка обработки {result['url']}: {str(e)}")
+                            continue
+                        yield PhonesFound(index, result['url'], result['phones'])
+                        yield InnsFound(index, result['url'], result['inns'])
+                except BudgetExceeded as e:
+                    print(f"Обработка группы сайтов прервана: {str(e)}")
+                finally:
+                    self._close_tabs([handle for handle, _ in tabs if handle])
+                    chunk_budget.release()
+
+            # После отмены драйвер закрыт, и незавершенные сайты падают с обычными ошибками
+            interrupted = chunk_budget.cancelled or chunk_budget.expired
+            for index in chunk:
+                if index not in extracted:
+                    results[index]['timed_out'] = interrupted
+                    yield SiteDone(index, results[index]['url'], results[index])
+
+            waiting = {index: set(results[index]['inns']) for index in extracted}
+            for index in [index for index, inns in waiting.items() if not inns]:
+                del waiting[index]
+                yield SiteDone(index, results[index]['url'], results[index])
+
+            inns = sorted({inn for pending_inns in waiting.values() for inn in pending_inns})
+            revenue_budget = budget.child(url_timeout)
+            try:
+                for inn, revenue_data in self._iter_revenues(inns, revenue_budget):
+                    for index in list(waiting):
+                        if inn not in waiting[index]:
+                            continue
+                        result = results[index]
+                        result['revenues'][inn] = revenue_data or "Финансовые данные не найдены"
+                        yield RevenueFound(index, result['url'], inn, result['revenues'][inn])
+
+                        waiting[index].discard(inn)
+                        if not waiting[index]:
+                            del waiting[index]
+                            yield SiteDone(index, result['url'], result)
+            except Exception as e:
+                print(f"Ошибка получения финансовых данных: {str(e)}")
+            finally:
+                revenue_budget.release()
+
+            # Сайты, по которым не успели получить все финансовые данные
+            for index in waiting:
+                result = results[index]
+                for inn in result['inns']:
+                    result['revenues'].setdefault(inn, "Финансовые данные не найдены")
+                result['timed_out'] = revenue_budget.cancelled or revenue_budget.expired
+                yield SiteDone(index, result['url'], result)
+
+    def extract_contacts_many(self, urls: List[str], budget: Optional[TimeBudget] = None,
+                              url_timeout: Optional[float] = None) -> List[Dict[str, any]]:
+        """Извлечение контактов с нескольких сайтов; результаты в порядке входных URL"""
+        results: List[Optional[Dict[str, any]]] = [None] * len(urls)
+        for event in self.iter_contacts_many(urls, budget, url_timeout):
+            if isinstance(event, SiteDone):
+                results[event.index] = event.result
+        return results
+
+    async def _aiter_events(self, produce: Callable[[TimeBudget], Iterator[ContactEvent]],
+                            budget: Optional[TimeBudget]) -> AsyncIterator[ContactEvent]:
+        """Перенос событий синхронного генератора из рабочего потока в цикл событий"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        # Собственный дочерний бюджет, чтобы остановить поток, если потребитель прервал итерацию
+        stream_budget = (budget or self.budget or TimeBudget()).child()
+
+        def run():
+            try:
+                for event in produce(stream_budget):
+                    loop.call_soon_threadsafe(queue.put_nowait, event)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+        producer = loop.run_in_executor(self.browser_executor(), run)
         try:
-            self.driver.quit()
-        except:
-            pass
\ No newline at end of file
+            while True:
+                item = await queue.get()
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            if not producer.done():
+                stream_budget.cancel()
+                await asyncio.wait([producer])
+            stream_budget.release()
+
+    def aiter_contacts(self, url: str, budget: Optional[TimeBudget] = None) -> AsyncIterator[ContactEvent]:
+        """Асинхронный вариант iter_contacts: Selenium работает в отдельном потоке"""
+        return self._aiter_events(lambda stream_budget: self.iter_contacts(url, stream_budget), budget)
+
+    def aiter_contacts_many(self, urls: List[str], budget: Optional[TimeBudget] = None,
+                            url_timeout: Optional[float] = None) -> AsyncIterator[ContactEvent]:
+        """Асинхронный вариант iter_contacts_many: Selenium работает в отдельном потоке"""
+        return self._aiter_events(
+            lambda stream_budget: self.iter_contacts_many(urls, stream_budget, url_timeout), budget)
+
+    def close(self):
+        """Закрытие драйвера и возврат профиля в пул; повторные и параллельные вызовы безопасны"""
+        with self._close_lock:
+            try:
+                self.driver.quit()
+            except:
+                pass
+            profile, self.profile = self.profile, None
+        # Профиль возвращается только после завершения Chrome, который его использовал
+        if profile:
+            self.profile_pool.release(profile)
\ No newline at end of file